@@ -0,0 +1,358 @@
+import asyncio
+import base64
+import json
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import logs
+import metrics
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Shared Agora REST client
+# =========================================
+# One keep-alive session for every call to api.agora.io so requests reuse
+# pooled TLS connections instead of handshaking each time.
+
+AGORA_BASE_URL = "https://api.agora.io"
+
+# (connect, read) timeouts in seconds, per endpoint class
+TIMEOUTS = {
+    "acquire": (3.05, 10),
+    "start": (3.05, 15),
+    "stop": (3.05, 15),
+    "query": (3.05, 5),
+    "sip": (3.05, 10),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Only idempotent calls are retried
+QUERY_RETRIES = 2
+RETRY_BACKOFF_BASE = 0.2   # seconds
+RETRY_BACKOFF_MAX = 2.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class AgoraClient:
+    def __init__(self, app_id, customer_id, customer_secret, base_url=AGORA_BASE_URL,
+                 pool_size=20, limiter=None):
+        self.app_id = app_id
+        self.base_url = base_url
+        # rate_limit.RateLimiter; every attempt waits for its endpoint's slot
+        self.limiter = limiter
+
+        encoded = base64.b64encode(f"{customer_id}:{customer_secret}".encode()).decode()
+        self.headers = {
+            "Authorization": f"Basic {encoded}",
+            "Content-Type": "application/json"
+        }
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # -----------------------------------------
+    # Low level
+    # -----------------------------------------
+    def _record(self, endpoint, elapsed, error=False):
+        metrics.observe_upstream("agora", endpoint, elapsed, "error" if error else "ok")
+
+    def request(self, endpoint, method, path, json=None, retries=0):
+        """Send a request to Agora and return the `requests.Response`.
+
+        `retries` > 0 should only be used for idempotent calls; failed
+        attempts back off with full jitter before trying again. Raises
+        `rate_limit.RateLimited` when the endpoint's QPS queue is full.
+        """
+        url = f"{self.base_url}{path}"
+        timeout = TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.wait(endpoint)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, json=json, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(endpoint, time.perf_counter() - started, error=True)
+                if attempt >= retries:
+                    raise
+            else:
+                failed = response.status_code in RETRY_STATUS
+                self._record(endpoint, time.perf_counter() - started, error=failed)
+                if not failed or attempt >= retries:
+                    return response
+
+            attempt += 1
+            backoff = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt))
+            time.sleep(random.uniform(0, backoff))
+
+    # -----------------------------------------
+    # Cloud recording
+    # -----------------------------------------
+    def acquire(self, channel, uid):
+        payload = {
+            "cname": channel,
+            "uid": uid,
+            "clientRequest": {}
+        }
+        return self.request(
+            "acquire", "POST",
+            f"/v1/apps/{self.app_id}/cloud_recording/acquire",
+            json=payload
+        )
+
+    def start(self, resource_id, payload):
+        return self.request(
+            "start", "POST",
+            f"/v1/apps/{self.app_id}/cloud_recording/resourceid/{resource_id}/mode/mix/start",
+            json=payload
+        )
+
+    def stop(self, resource_id, sid, channel, uid):
+        payload = {
+            "cname": channel,
+            "uid": uid,
+            "clientRequest": {}
+        }
+        return self.request(
+            "stop", "POST",
+            f"/v1/apps/{self.app_id}/cloud_recording/resourceid/{resource_id}/sid/{sid}/mode/mix/stop",
+            json=payload
+        )
+
+    def query(self, resource_id, sid):
+        return self.request(
+            "query", "GET",
+            f"/v1/apps/{self.app_id}/cloud_recording/resourceid/{resource_id}/sid/{sid}/mode/mix/query",
+            retries=QUERY_RETRIES
+        )
+
+    # -----------------------------------------
+    # SIP gateway
+    # -----------------------------------------
+    def create_sip_call(self, payload):
+        return self.request(
+            "sip", "POST",
+            f"/v1/projects/{self.app_id}/sip-gateway/nodes",
+            json=payload
+        )
+
+
+class AgoraResponse:
+    """Buffered async response with the parts of `requests.Response` callers use."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncAgoraClient(AgoraClient):
+    """AgoraClient for the ASGI entry point (asgi.py) on a non-blocking aiohttp pool.
+
+    Only `request` differs, so acquire/start/stop/query/create_sip_call
+    return awaitables of an `AgoraResponse`.
+    """
+
+    def __init__(self, app_id, customer_id, customer_secret, base_url=AGORA_BASE_URL,
+                 pool_size=200, limiter=None):
+        self.app_id = app_id
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.limiter = limiter
+
+        encoded = base64.b64encode(f"{customer_id}:{customer_secret}".encode()).decode()
+        self.headers = {
+            "Authorization": f"Basic {encoded}",
+            "Content-Type": "application/json"
+        }
+
+        # aiohttp sessions belong to the event loop they are created on
+        self.session = None
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, endpoint, method, path, json=None, retries=0):
+        import aiohttp
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers=self.headers, connector=aiohttp.TCPConnector(limit=self.pool_size)
+            )
+
+        url = f"{self.base_url}{path}"
+        connect, read = TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+        timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+        attempt = 0
+        while True:
+            if self.limiter:
+                await self.limiter.wait_async(endpoint)
+            started = time.perf_counter()
+            try:
+                async with self.session.request(method, url, json=json, timeout=timeout) as resp:
+                    response = AgoraResponse(resp.status, await resp.text())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._record(endpoint, time.perf_counter() - started, error=True)
+                if attempt >= retries:
+                    raise
+            else:
+                failed = response.status_code in RETRY_STATUS
+                self._record(endpoint, time.perf_counter() - started, error=failed)
+                if not failed or attempt >= retries:
+                    return response
+
+            attempt += 1
+            backoff = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt))
+            await asyncio.sleep(random.uniform(0, backoff))
+
+
+# =========================================
+# sipcm.agora.io (inbound SIP URIs)
+# =========================================
+SIPCM_URL = "https://sipcm.agora.io/v1/api/pstn"
+SIPCM_TIMEOUT = (3.05, 5)
+
+
+class SipcmError(Exception):
+    def __init__(self, status_code, text):
+        super().__init__(f"sipcm returned {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+def _sipcm_headers(authorization):
+    headers = {"Content-Type": "application/json"}
+    if authorization:
+        headers["Authorization"] = authorization
+    return headers
+
+
+def _require_credentials(authorization):
+    # Not sipcm's fault, so it's raised before the breaker sees a call
+    if not authorization:
+        raise SipcmError(401, "no sipcm credentials configured (AGORA_SIPCM_AUTH)")
+
+
+class SipcmClient:
+    def __init__(self, app_id, authorization, url=SIPCM_URL, pool_size=10, breaker=None):
+        self.app_id = app_id
+        self.url = url
+        # circuit_breaker.CircuitBreaker; while open, calls fail fast with CircuitOpen
+        self.breaker = breaker
+        self.authorization = authorization
+
+        self.session = requests.Session()
+        self.session.headers.update(_sipcm_headers(authorization))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def inbound_sip(self, channel, token, region, uid="0"):
+        """Ask sipcm for an inbound SIP URI; returns the decoded JSON body."""
+        _require_credentials(self.authorization)
+        if self.breaker:
+            self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            resp = self.session.post(
+                self.url,
+                json={
+                    "action": "inboundsip",
+                    "appid": self.app_id,
+                    "token": token,
+                    "uid": uid,
+                    "channel": channel,
+                    "region": region
+                },
+                timeout=SIPCM_TIMEOUT
+            )
+        except requests.RequestException:
+            elapsed = time.perf_counter() - started
+            metrics.observe_upstream("sipcm", "inboundsip", elapsed, "error")
+            if self.breaker:
+                self.breaker.record(False)
+            raise
+        elapsed = time.perf_counter() - started
+        metrics.observe_upstream("sipcm", "inboundsip", elapsed,
+                                 "ok" if resp.status_code == 200 else "error")
+        if self.breaker:
+            self.breaker.record(resp.status_code == 200, elapsed)
+        log.info("sipcm response", status=resp.status_code, body=resp.text, sample=logs.HOT_PATH_SAMPLE)
+        if resp.status_code != 200:
+            raise SipcmError(resp.status_code, resp.text)
+        return resp.json()
+
+
+class AsyncSipcmClient:
+    """SipcmClient for asgi.py; `inbound_sip` is a coroutine."""
+
+    def __init__(self, app_id, authorization, url=SIPCM_URL, pool_size=50, breaker=None):
+        self.app_id = app_id
+        self.url = url
+        self.pool_size = pool_size
+        self.breaker = breaker
+        self.authorization = authorization
+        self.headers = _sipcm_headers(authorization)
+        self.session = None
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def inbound_sip(self, channel, token, region, uid="0"):
+        import aiohttp
+
+        _require_credentials(self.authorization)
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers=self.headers, connector=aiohttp.TCPConnector(limit=self.pool_size)
+            )
+
+        if self.breaker:
+            self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            async with self.session.post(
+                self.url,
+                json={
+                    "action": "inboundsip",
+                    "appid": self.app_id,
+                    "token": token,
+                    "uid": uid,
+                    "channel": channel,
+                    "region": region
+                },
+                timeout=aiohttp.ClientTimeout(sock_connect=SIPCM_TIMEOUT[0], sock_read=SIPCM_TIMEOUT[1])
+            ) as resp:
+                status_code, text = resp.status, await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            elapsed = time.perf_counter() - started
+            metrics.observe_upstream("sipcm", "inboundsip", elapsed, "error")
+            if self.breaker:
+                self.breaker.record(False)
+            raise
+        elapsed = time.perf_counter() - started
+        metrics.observe_upstream("sipcm", "inboundsip", elapsed,
+                                 "ok" if status_code == 200 else "error")
+        if self.breaker:
+            self.breaker.record(status_code == 200, elapsed)
+        log.info("sipcm response", status=status_code, body=text, sample=logs.HOT_PATH_SAMPLE)
+        if status_code != 200:
+            raise SipcmError(status_code, text)
+        return json.loads(text)
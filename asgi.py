@@ -0,0 +1,387 @@
+import asyncio
+import contextvars
+import functools
+import io
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.exceptions import InternalServerError
+
+import app as sync_app
+import logs
+import metrics
+from agora_client import AsyncAgoraClient, AsyncSipcmClient, SipcmError
+from rate_limit import RateLimited
+from recording import build_start_payload
+from singleflight import AsyncGroup
+from sip_uri_cache import token_fingerprint
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Async (ASGI) entry point
+# =========================================
+# Same routes and payloads as app.py, served from one event loop:
+#
+#     uvicorn asgi:app
+#
+# Routes that mostly wait on Agora or sipcm (/inbound, /acquire, /start,
+# /stop, /query, /generate-inbound, /make-call) are handled here with
+# non-blocking aiohttp clients, so a single process can hold hundreds of
+# calls in flight. The Firestore/FCM SDKs have no async API; their calls,
+# and every other route (the Flask app itself), run on a bounded thread
+# pool. The caches, pools, session store and background queues are the
+# ones app.py builds, so both modes behave the same.
+
+# Threads for blocking SDK calls and Flask routes
+BLOCKING_WORKERS = int(os.environ.get("ASGI_BLOCKING_WORKERS", "32"))
+
+blocking_pool = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="asgi-blocking")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()   # keeps the request ID / call SID for logging
+    return await loop.run_in_executor(blocking_pool, context.run, functools.partial(fn, *args, **kwargs))
+
+
+agora = AsyncAgoraClient(sync_app.APP_ID, sync_app.CUSTOMER_ID, sync_app.CUSTOMER_SECRET,
+                         base_url=sync_app.agora.base_url, limiter=sync_app.agora_limiter)
+sipcm = AsyncSipcmClient(sync_app.APP_ID, sync_app.SIPCM_AUTH, url=sync_app.sipcm.url,
+                         breaker=sync_app.sipcm_breaker)
+sip_fetches = AsyncGroup()
+query_fetches = AsyncGroup()
+
+
+# -----------------------------------------
+# Request / response plumbing
+# -----------------------------------------
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query_string = scope.get("query_string", b"")
+        self.headers = {name.decode("latin1").lower(): value.decode("latin1")
+                        for name, value in scope.get("headers", [])}
+        self.body = body
+
+    @property
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+    @property
+    def values(self):
+        """Query string + form body, like Flask's request.values."""
+        values = dict(parse_qsl(self.query_string.decode("latin1")))
+        if self.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+            values.update(parse_qsl(self.body.decode("utf-8")))
+        return values
+
+
+def json_response(data, status=200, headers=()):
+    # Flask's own JSON provider, so bodies match jsonify() byte for byte
+    return status, "application/json", sync_app.app.json.response(data).get_data(), list(headers)
+
+
+def xml_response(text):
+    return 200, "text/xml; charset=utf-8", text.encode(), []
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+# -----------------------------------------
+# Inbound SIP URIs (shared cache, async fetch on a miss)
+# -----------------------------------------
+async def sip_uri_data(channel, token):
+    data = sync_app.sip_uris.peek(channel, sync_app.SIP_REGION, token)
+    if data is not None:
+        return data
+    key = (channel, sync_app.SIP_REGION, token_fingerprint(token))
+    return await sip_fetches.do(key, fetch_sip_uri, channel, token)
+
+
+async def inbound_sip_data(channel, token):
+    """asgi version of app.inbound_sip_data: last-known-good URI or None once
+    the latency budget is spent (the fetch itself carries on, shielded)."""
+    try:
+        return await asyncio.wait_for(sip_uri_data(channel, token), sync_app.SIP_LATENCY_BUDGET)
+    except Exception as e:
+        log.warning("Failed to get SIP URI, using fallback", channel=channel, error=e)
+    return sync_app.sip_uris.last_known_good(channel, sync_app.SIP_REGION)
+
+
+async def fetch_sip_uri(channel, token):
+    data = await sipcm.inbound_sip(channel, token, sync_app.SIP_REGION)
+    return sync_app.sip_uris.store(channel, sync_app.SIP_REGION, token, data)
+
+
+# -----------------------------------------
+# Routes
+# -----------------------------------------
+async def acquire(request):
+    data = request.json
+    channel = data["channel"]
+    uid = str(data["uid"])
+
+    resource_id = sync_app.resource_pool.take(channel, uid)
+    if resource_id:
+        return json_response({"cname": channel, "uid": uid, "resourceId": resource_id})
+
+    response = await agora.acquire(channel, uid)
+    return json_response(response.json())
+
+
+async def start(request):
+    data = request.json
+    channel = data["channel"]
+    uid = data.get("uid", "0")
+    resource_id = data["resourceId"]
+    token = data.get("agora_token", sync_app.TOKEN)
+
+    payload = build_start_payload(channel, uid, token, sync_app.STORAGE_CONFIG)
+    result = (await agora.start(resource_id, payload)).json()
+
+    await run_blocking(sync_app.track_started_recording,
+                       data.get("callSid"), channel, uid, resource_id, result)
+    return json_response(result)
+
+
+async def stop(request):
+    data = request.json
+    channel = data["channel"]
+    uid = data.get("uid", "0")
+    resource_id = data["resourceId"]
+    sid = data["sid"]
+    log.info("Stopping recording", resource_id=resource_id, sid=sid, channel=channel, uid=uid)
+
+    r = await agora.stop(resource_id, sid, channel, uid)
+    log.info("Stop recording response", sid=sid, status=r.status_code, agora=r.text)
+
+    await run_blocking(sync_app.mark_recording_stopped, sid, r.status_code)
+    return json_response(r.json())
+
+
+async def query_recording(request):
+    data = request.json
+    resource_id, sid = data["resourceId"], data["sid"]
+
+    cached = sync_app.recording_queries.peek(resource_id, sid)
+    if cached is not None:
+        r, age = cached
+        return json_response(r.json(), headers=sync_app.query_cache_headers(age, True, True).items())
+
+    generation = sync_app.recording_queries.generation(sid)
+    r, stored = await query_fetches.do((resource_id, sid), fetch_query, resource_id, sid, generation)
+    return json_response(r.json(), headers=sync_app.query_cache_headers(0.0, False, stored).items())
+
+
+async def fetch_query(resource_id, sid, generation):
+    r = await agora.query(resource_id, sid)
+    return sync_app.recording_queries.store(resource_id, sid, r, generation)
+
+
+async def make_call(request):
+    data = request.json
+    channel = data.get("channel")
+    phone_number = data.get("phone")
+    token = data.get("token")
+    uid = data.get("uid", 0)
+
+    if not channel or not phone_number or not token:
+        return json_response({"error": "missing data"}, 400)
+
+    response = await agora.create_sip_call(sync_app.sip_call_payload(channel, phone_number, token, uid))
+    return json_response(response.json(), response.status_code)
+
+
+async def generate_inbound(request):
+    channel = request.json.get('channel', 'test_channel')
+
+    try:
+        sip_data = await sip_uri_data(channel, sync_app.TOKEN)
+    except SipcmError as e:
+        return json_response({"error": e.text}, 500)
+    except Exception as e:
+        log.warning("sipcm request failed", channel=channel, error=e)
+        return json_response({"error": str(e)}, 500)
+
+    return json_response(sip_data)
+
+
+async def inbound_call(request):
+    values = request.values
+    from_number = values.get("From")
+    call_sid = values.get("CallSid")
+
+    log.info("Incoming call", from_number=from_number)
+
+    token = await run_blocking(sync_app.register_inbound_call, from_number, call_sid)
+
+    sip_data = await inbound_sip_data("test_channel", token)
+    if sip_data is None:
+        return xml_response(sync_app.inbound_fallback_twiml("Sorry, we couldn't connect you right now."))
+
+    return xml_response(sync_app.inbound_twiml(sip_data))
+
+
+ROUTES = {
+    ("POST", "/acquire"): acquire,
+    ("POST", "/start"): start,
+    ("POST", "/stop"): stop,
+    ("POST", "/query"): query_recording,
+    ("POST", "/make-call"): make_call,
+    ("POST", "/generate-inbound"): generate_inbound,
+    ("POST", "/inbound"): inbound_call,
+}
+
+
+async def handle(handler, request):
+    route = request.path
+    started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc(route)
+    request_id = logs.new_request_id(request.headers)
+    try:
+        body = request.json if request.headers.get("content-type", "").startswith("application/json") else None
+    except ValueError:
+        body = None   # the handler reports bad JSON itself
+    body = body if isinstance(body, dict) else {}
+    log_tokens = logs.bind(request=request_id,
+                           call=request.values.get("CallSid") or body.get("callSid") or body.get("call_sid"))
+    try:
+        try:
+            status, content_type, content, extra_headers = await handler(request)
+        except RateLimited as e:
+            status, content_type, content, extra_headers = json_response(
+                {"error": str(e), "endpoint": e.endpoint}, 429,
+                [("Retry-After", str(math.ceil(e.retry_after)))]
+            )
+        except Exception:
+            log.exception("Unhandled error", route=route)
+            error = InternalServerError()
+            status, content_type, content = 500, "text/html; charset=utf-8", error.get_body().encode()
+            extra_headers = []
+        labels = (route, request.method, str(status))
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - started, *labels)
+        metrics.HTTP_REQUESTS.inc(*labels)
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec(route)
+        logs.unbind(log_tokens)
+    headers = [("Content-Type", content_type), ("Content-Length", str(len(content))),
+               ("X-Request-ID", request_id)]
+    return status, headers + extra_headers, content
+
+
+# -----------------------------------------
+# Everything else → the Flask app on the blocking pool
+# -----------------------------------------
+def start_flask(scope, body):
+    """Run the Flask app up to its first body chunk; returns (status, headers, body iterable)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = headers
+
+    result = sync_app.app(environ, start_response)
+    return response["status"], response["headers"], result
+
+
+async def send_flask(scope, body, send):
+    # Streamed responses (recording downloads) are relayed chunk by chunk,
+    # each pulled on the blocking pool, so nothing is buffered whole
+    status, headers, result = await run_blocking(start_flask, scope, body)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.encode("latin1"), value.encode("latin1")) for name, value in headers],
+    })
+    chunks = iter(result)
+    try:
+        while True:
+            chunk = await run_blocking(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            await run_blocking(result.close)
+
+
+# -----------------------------------------
+# ASGI callable
+# -----------------------------------------
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await agora.close()
+            await sipcm.close()
+            # Drain write-behind Firestore writes before the process goes away
+            await run_blocking(sync_app.firestore_writes.flush)
+            blocking_pool.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    body = await read_body(receive)
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        return await send_flask(scope, body, send)
+
+    status, headers, content = await handle(handler, Request(scope, body))
+
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.encode("latin1"), value.encode("latin1")) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": content})
@@ -0,0 +1,107 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Bounded background work queue
+# =========================================
+# Side effects that the caller does not need to wait for (Firestore writes,
+# push notifications) run here so request handlers can return early.
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 100
+RECENT_FAILURES = 50
+
+
+class BackgroundQueue:
+    def __init__(self, name="background", workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 inline_when_full=False):
+        self.name = name
+        self.max_pending = max_pending
+        # Full queue: run the task in the caller (work that must not be lost)
+        # instead of shedding it (work whose caller must not wait)
+        self.inline_when_full = inline_when_full
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.ran_inline = 0
+        self.shed = 0
+        # (timestamp, task name, error) for the most recent failures
+        self.recent_failures = deque(maxlen=RECENT_FAILURES)
+
+    def submit(self, task_name, fn, *args, **kwargs):
+        """Run `fn` on a worker thread.
+
+        When `max_pending` tasks are already queued the task is shed (counted
+        as failed and logged) so the caller never waits on it, or, with
+        `inline_when_full`, runs in the caller instead.
+        """
+        with self._lock:
+            full = self.pending >= self.max_pending
+            if not full:
+                self.pending += 1
+            elif self.inline_when_full:
+                self.ran_inline += 1
+            else:
+                self.shed += 1
+                self.failed += 1
+                self.recent_failures.append((time.time(), task_name, "shed: queue full"))
+
+        if full and self.inline_when_full:
+            log.warning("Background queue full, running task inline", queue=self.name,
+                        task=task_name, max_pending=self.max_pending)
+            self._run(task_name, fn, args, kwargs)
+            return None
+        if full:
+            log.warning("Background queue full, task shed", queue=self.name,
+                        task=task_name, max_pending=self.max_pending)
+            return None
+
+        # Tasks log with the request ID / call SID of the request that queued them
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._run_queued, task_name, fn, args, kwargs)
+
+    def _run_queued(self, task_name, fn, args, kwargs):
+        try:
+            return self._run(task_name, fn, args, kwargs)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _run(self, task_name, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                self.recent_failures.append((time.time(), task_name, repr(e)))
+            log.exception("Background task failed", queue=self.name, task=task_name, error=e)
+            return None
+
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "ran_inline": self.ran_inline,
+                "shed": self.shed,
+                "recent_failures": list(self.recent_failures),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,86 @@
+"""Cold-start budget check for the Vercel entry point.
+
+Imports app.py in a fresh interpreter (as a cold start would), reports the
+import time per top-level module from `python -X importtime`, and exits
+non-zero when the import goes over the time or memory budget.
+
+    python benchmarks/bench_import.py [--max-seconds 0.6] [--max-mb 60] [--top 15]
+
+Background prewarming (SIP URIs, resourceId pool, phone index listener) is
+switched off so only the import itself is measured.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = (
+    "import resource, time\n"
+    "started = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(f'{elapsed} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}')\n"
+)
+
+
+def child_env():
+    env = dict(os.environ)
+    env.update({
+        "SIP_PREWARM_CHANNELS": "",
+        "RESOURCE_POOL_CHANNELS": "",
+        "PHONE_INDEX_LISTEN": "0",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def import_breakdown():
+    """Return {top-level module: self seconds} from -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    totals = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return totals
+
+
+def measure():
+    proc = subprocess.run(
+        [sys.executable, "-c", MEASURE],
+        cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    seconds, max_rss_kb = proc.stdout.strip().splitlines()[-1].split()
+    return float(seconds), int(max_rss_kb) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-seconds", type=float, default=0.6)
+    parser.add_argument("--max-mb", type=float, default=60)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    totals = import_breakdown()
+    print(f"{'module':<32} {'self_s':>8}")
+    for name, seconds in sorted(totals.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<32} {seconds:>8.4f}")
+
+    seconds, max_mb = measure()
+    print(f"\nimport app: {seconds:.3f}s (budget {args.max_seconds}s), "
+          f"max RSS {max_mb:.1f} MB (budget {args.max_mb} MB)")
+
+    if seconds > args.max_seconds or max_mb > args.max_mb:
+        print("OVER BUDGET")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
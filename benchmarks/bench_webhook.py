@@ -0,0 +1,95 @@
+"""Benchmark signed-URL generation for a recording's fileList (HLS playlists).
+
+Compares the old per-blob `generate_signed_url` loop with the batch signer
+(cold cache and warm cache) for fileLists of 10, 1k and 10k entries.
+
+    python benchmarks/bench_webhook.py [--sizes 10,1000,10000] [--skip-baseline]
+
+Uses GOOGLE_SERVICE_ACCOUNT when set, otherwise a throwaway RSA key; no
+network calls are made either way.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.cloud import storage
+from google.oauth2 import service_account
+
+from recording_urls import SignedUrlSigner
+
+
+def load_credentials():
+    if os.environ.get("GOOGLE_SERVICE_ACCOUNT"):
+        info = json.loads(os.environ["GOOGLE_SERVICE_ACCOUNT"])
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        info = {
+            "type": "service_account",
+            "project_id": "bench",
+            "private_key_id": "bench",
+            "private_key": key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            ).decode(),
+            "client_email": "bench@bench.iam.gserviceaccount.com",
+            "client_id": "0",
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }
+    return service_account.Credentials.from_service_account_info(info)
+
+
+def file_list(size):
+    return [f"records/bench_{i:05d}.ts" for i in range(size)]
+
+
+def bench_baseline(credentials, names):
+    client = storage.Client(project="bench", credentials=credentials)
+    bucket = client.bucket("bench-bucket")
+    started = time.perf_counter()
+    for name in names:
+        bucket.blob(name).generate_signed_url(
+            version="v4",
+            expiration=datetime.timedelta(hours=1),
+            method="GET",
+        )
+    return time.perf_counter() - started
+
+
+def bench_batch(credentials, names):
+    signer = SignedUrlSigner(credentials, "bench-bucket")
+    started = time.perf_counter()
+    signer.sign_many(names)
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    signer.sign_many(names)
+    warm = time.perf_counter() - started
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,1000,10000")
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    credentials = load_credentials()
+    print(f"{'files':>8} {'baseline_s':>12} {'batch_cold_s':>13} {'batch_warm_s':>13}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        names = file_list(size)
+        baseline = None if args.skip_baseline else bench_baseline(credentials, names)
+        cold, warm = bench_batch(credentials, names)
+        baseline_col = "-" if baseline is None else f"{baseline:.4f}"
+        print(f"{size:>8} {baseline_col:>12} {cold:>13.4f} {warm:>13.4f}")
+
+
+if __name__ == "__main__":
+    main()
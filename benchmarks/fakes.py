@@ -0,0 +1,287 @@
+"""Local stand-ins for the services app.py talks to, for offline benchmarks.
+
+- FakeAgoraServer: local HTTP server answering api.agora.io cloud_recording /
+  sip-gateway calls and sipcm.agora.io inboundsip, with configurable latency.
+- FakeFirestore: in-memory documents, queries, batches and a no-op
+  on_snapshot, with configurable per-operation latency.
+- FakeMessaging: forwards to firebase_admin.messaging for message/error
+  types but "sends" locally.
+"""
+import asyncio
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+
+
+def _sleep(latency, jitter):
+    if latency > 0:
+        time.sleep(max(0.0, random.gauss(latency, latency * jitter)))
+
+
+# =========================================
+# Agora REST + sipcm
+# =========================================
+class FakeAgoraServer:
+    """aiohttp server on its own event loop thread.
+
+    An event loop rather than a thread per connection, so the fake itself
+    stays cheap when the app holds hundreds of connections open.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.2, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.host = host
+        self.port = port
+        self.calls = 0
+        self.url = None
+        self._loop = None
+        self._runner = None
+
+    def answer(self, path, body):
+        if path.endswith("/acquire"):
+            return {"cname": body.get("cname"), "uid": body.get("uid"),
+                    "resourceId": uuid.uuid4().hex}
+        if path.endswith("/start"):
+            return {"cname": body.get("cname"), "uid": body.get("uid"),
+                    "resourceId": path.split("/resourceid/")[1].split("/")[0],
+                    "sid": uuid.uuid4().hex}
+        if path.endswith("/stop"):
+            return {"serverResponse": {"fileList": [], "uploadingStatus": "uploaded"}}
+        if path.endswith("/query"):
+            return {"serverResponse": {"status": 5, "fileList": []}}
+        if path.endswith("/pstn"):
+            return {"sip": f"sip:{body.get('channel')}@sip.fake.agora.io"}
+        if path.endswith("/nodes"):
+            return {"callid": uuid.uuid4().hex}
+        return {}
+
+    async def _reply(self, request):
+        from aiohttp import web
+
+        raw = await request.read()
+        body = json.loads(raw) if raw else {}
+        self.calls += 1
+        if self.latency > 0:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.latency * self.jitter)))
+        return web.json_response(self.answer(request.path, body))
+
+    def start(self):
+        from aiohttp import web
+
+        ready = threading.Event()
+
+        async def serve():
+            app = web.Application()
+            app.router.add_route("*", "/{tail:.*}", self._reply)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            self.url = f"http://{self.host}:{port}"
+            ready.set()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(serve())
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name="fake-agora", daemon=True).start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+# =========================================
+# Firestore
+# =========================================
+def _merge(current, data):
+    """Apply a set(merge=True)-style write, resolving Firestore transforms."""
+    from google.cloud.firestore_v1 import transforms
+
+    merged = dict(current or {})
+    for key, value in data.items():
+        if value is transforms.SERVER_TIMESTAMP:
+            value = datetime.datetime.now(datetime.timezone.utc)
+        elif isinstance(value, transforms.ArrayUnion):
+            existing = list(merged.get(key) or [])
+            value = existing + [v for v in value.values if v not in existing]
+        elif isinstance(value, transforms.ArrayRemove):
+            value = [v for v in merged.get(key) or [] if v not in value.values]
+        merged[key] = value
+    return merged
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+}
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store, collection, doc_id):
+        self.store = store
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self.store.op()
+        with self.store.lock:
+            docs = self.store.docs.setdefault(self.collection, {})
+            docs[self.id] = _merge(docs.get(self.id) if merge else None, data)
+
+    def update(self, data):
+        self.set(data, merge=True)
+
+    def get(self):
+        self.store.op()
+        with self.store.lock:
+            return FakeSnapshot(self.id, self.store.docs.get(self.collection, {}).get(self.id))
+
+    def delete(self):
+        self.store.op()
+        with self.store.lock:
+            self.store.docs.get(self.collection, {}).pop(self.id, None)
+
+
+class FakeQuery:
+    def __init__(self, store, collection, filters=(), max_results=None, order=None, after=None):
+        self.store = store
+        self.collection = collection
+        self.filters = filters
+        self.max_results = max_results
+        self.order = order        # (field, descending)
+        self.after = after        # snapshot to start after
+
+    def _copy(self, **changes):
+        fields = dict(filters=self.filters, max_results=self.max_results,
+                      order=self.order, after=self.after)
+        fields.update(changes)
+        return FakeQuery(self.store, self.collection, **fields)
+
+    def where(self, filter):
+        return self._copy(filters=self.filters + ((filter.field_path, filter.op_string, filter.value),))
+
+    def limit(self, count):
+        return self._copy(max_results=count)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(order=(field, direction == "DESCENDING"))
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    def get(self):
+        self.store.op()
+        with self.store.lock:
+            docs = self.store.docs.get(self.collection, {})
+            found = [
+                FakeSnapshot(doc_id, data) for doc_id, data in docs.items()
+                if all(_OPS[op](data.get(field), value) for field, op, value in self.filters)
+            ]
+        if self.order:
+            field, descending = self.order
+            found = [f for f in found if f._data.get(field) is not None]
+            found.sort(key=lambda f: (f._data[field], f.id), reverse=descending)
+        if self.after is not None:
+            ids = [f.id for f in found]
+            found = found[ids.index(self.after.id) + 1:] if self.after.id in ids else found
+        return found[:self.max_results] if self.max_results else found
+
+    stream = get
+
+    def on_snapshot(self, callback):
+        class Watch:
+            def unsubscribe(self):
+                pass
+        return Watch()
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id):
+        return FakeDocument(self.store, self.collection, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self.store = store
+        self.writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self.writes.append((doc_ref, data, merge))
+
+    def delete(self, doc_ref):
+        self.writes.append((doc_ref, None, False))
+
+    def commit(self):
+        self.store.op()
+        with self.store.lock:
+            for doc_ref, data, merge in self.writes:
+                docs = self.store.docs.setdefault(doc_ref.collection, {})
+                if data is None:
+                    docs.pop(doc_ref.id, None)
+                else:
+                    docs[doc_ref.id] = _merge(docs.get(doc_ref.id) if merge else None, data)
+
+
+class FakeFirestore:
+    def __init__(self, latency=0.02, jitter=0.2):
+        self.latency = latency
+        self.jitter = jitter
+        self.docs = {}
+        self.lock = threading.Lock()
+        self.ops = 0
+
+    def op(self):
+        self.ops += 1
+        _sleep(self.latency, self.jitter)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+# =========================================
+# FCM
+# =========================================
+class FakeMessaging:
+    def __init__(self, latency=0.05, jitter=0.2):
+        from firebase_admin import messaging
+
+        self._real = messaging
+        self.latency = latency
+        self.jitter = jitter
+        self.sent = 0
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+    def send_each_for_multicast(self, message):
+        _sleep(self.latency, self.jitter)
+        self.sent += len(message.tokens)
+        return self._real.BatchResponse([
+            self._real.SendResponse({"name": f"projects/fake/messages/{uuid.uuid4().hex}"}, None)
+            for _ in message.tokens
+        ])
@@ -0,0 +1,283 @@
+"""Offline load test for app.py against local fakes.
+
+Drives /inbound, /start, /stop, /query, /webhook and /token at a given
+concurrency with Agora/sipcm served by a local HTTP stand-in and Firestore,
+FCM and GCS signing replaced in-process (see fakes.py). Reports throughput
+and p50/p95/p99 per route and can write/compare JSON results, so numbers
+from two commits can be put side by side:
+
+    python benchmarks/loadtest.py --requests 500 --concurrency 32 --output before.json
+    python benchmarks/loadtest.py --requests 500 --concurrency 32 --compare before.json
+
+--asgi sends the same requests through asgi.py on one event loop instead of
+the Flask app on a thread pool.
+
+The app's Agora rate limiter is opened up (--agora-qps, default 10000 per
+endpoint) so the numbers measure the code rather than the limiter; pass
+--agora-qps 10 to run with the production limit.
+
+Nothing leaves the machine; no credentials are needed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+ROUTES = ["inbound", "start", "stop", "query", "webhook", "token"]
+
+
+def configure_env(agora_qps):
+    os.environ.update({
+        "AGORA_APP_ID": "0123456789abcdef0123456789abcdef",
+        "AGORA_APP_CERTIFICATE": "fedcba9876543210fedcba9876543210",
+        "AGORA_CUSTOMER_ID": "bench",
+        "AGORA_CUSTOMER_SECRET": "bench",
+        "AGORA_BUCKET_NAME": "bench-bucket",
+        "AGORA_SIPCM_AUTH": "Basic YmVuY2g6YmVuY2g=",
+        "SIP_PREWARM_CHANNELS": "",
+        "RESOURCE_POOL_CHANNELS": "",
+        "PHONE_INDEX_LISTEN": "0",
+        "AGORA_QPS": ",".join(f"{endpoint}={agora_qps}" for endpoint in ("acquire", "start", "stop", "query")),
+        "AGORA_QPS_SPLIT": "1",
+        "WEBHOOK_SPOOL_PATH": os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "webhooks.sqlite3"),
+    })
+
+
+def load_app(args):
+    configure_env(args.agora_qps)
+    from fakes import FakeAgoraServer, FakeFirestore, FakeMessaging
+    from bench_webhook import load_credentials
+    import app
+    import clients
+
+    server = FakeAgoraServer(latency=args.agora_latency).start()
+    app.agora.base_url = server.url
+    app.sipcm.url = f"{server.url}/v1/api/pstn"
+    if args.asgi:
+        import asgi
+        asgi.agora.base_url = server.url
+        asgi.sipcm.url = app.sipcm.url
+
+    firestore = FakeFirestore(latency=args.firestore_latency)
+    messaging = FakeMessaging(latency=args.fcm_latency)
+    credentials = load_credentials()
+    clients.db = lambda: firestore
+    clients.messaging = lambda: messaging
+    clients.gcs_credentials = lambda: credentials
+    # Built at import time with the real factory
+    app.recording_catalog.get_db = clients.db
+    app.firestore_writes.get_db = clients.db
+    app.token_docs.get_db = clients.db
+
+    # One user owning the Twilio number, with a couple of devices
+    firestore.collection('users').document('bench_user').set({
+        'phoneNumber': "+15078703438", 'fcmTokens': ["device-a", "device-b"],
+    })
+    return app, server
+
+
+def build_request(route, i, state):
+    """Return (path, kwargs) for request number `i` of `route`."""
+    if route == "inbound":
+        return "/inbound", {"data": {"From": f"+1555{i % 50:07d}", "CallSid": f"CA{i:032d}"}}
+    if route == "start":
+        return "/start", {"json": {"channel": f"bench_{i % 20}", "uid": "0",
+                                   "resourceId": f"res{i}", "callSid": f"CA{i:032d}"}}
+    if route == "stop":
+        return "/stop", {"json": {"channel": f"bench_{i % 20}", "uid": "0",
+                                  "resourceId": f"res{i}", "sid": f"sid{i}"}}
+    if route == "query":
+        return "/query", {"json": {"resourceId": f"res{i % 20}", "sid": f"sid{i % 20}"}}
+    if route == "webhook":
+        # Callbacks for the same recording repeat, and every notice is
+        # delivered twice (Agora retrying); each carries a segment list
+        recording = i % 10
+        files = [{"fileName": f"records/rec{recording}_{n:05d}.ts"} for n in range(state["segments"])]
+        return "/webhook", {"json": {"noticeId": f"n{i // 2}", "eventType": 31,
+                                     "payload": {"sid": f"sid{recording}", "fileList": files}}}
+    if route == "token":
+        return "/token", {"json": {"channel": "test_channel", "uid": 0, "role": 1}}
+    raise ValueError(route)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(results, wall):
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "throughput_rps": round(len(results) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_route(app, route, args, state):
+    def one(i):
+        client = app.app.test_client()
+        path, kwargs = build_request(route, i, state)
+        started = time.perf_counter()
+        response = client.post(path, **kwargs)
+        return time.perf_counter() - started, response.status_code
+
+    for i in range(args.warmup):
+        one(i)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.warmup, args.warmup + args.requests)))
+    wall = time.perf_counter() - started
+    return summarize(results, wall)
+
+
+async def asgi_post(app, path, **request):
+    """POST `json=` or form `data=` straight into an ASGI app; returns the status."""
+    if "json" in request:
+        body, content_type = json.dumps(request["json"]).encode(), b"application/json"
+    else:
+        body, content_type = urlencode(request.get("data", {})).encode(), b"application/x-www-form-urlencoded"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "server": ("loadtest", 80), "client": ("127.0.0.1", 0),
+        "headers": [(b"host", b"loadtest"), (b"content-type", content_type),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()  # never disconnects
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_routes_asgi(routes, args, state):
+    # One event loop for every route: asgi.py's aiohttp sessions are bound to it
+    import asgi
+
+    results = {route: await run_route_asgi(asgi.app, route, args, state) for route in routes}
+    await asgi.agora.close()
+    await asgi.sipcm.close()
+    return results
+
+
+async def run_route_asgi(app, route, args, state):
+    async def one(i):
+        path, kwargs = build_request(route, i, state)
+        started = time.perf_counter()
+        status = await asgi_post(app, path, **kwargs)
+        return time.perf_counter() - started, status
+
+    for i in range(args.warmup):
+        await one(i)
+
+    pending = iter(range(args.warmup, args.warmup + args.requests))
+    results = []
+
+    async def worker():
+        for i in pending:
+            results.append(await one(i))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    return summarize(results, wall)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_table(results, previous=None):
+    header = f"{'route':<10} {'rps':>10} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'errors':>7}"
+    if previous:
+        header += f" {'Δp95':>9} {'Δrps':>9}"
+    print(header)
+    for route, r in results.items():
+        line = (f"{route:<10} {r['throughput_rps']:>10} {r['p50_ms']:>9} "
+                f"{r['p95_ms']:>9} {r['p99_ms']:>9} {r['errors']:>7}")
+        before = (previous or {}).get(route)
+        if before:
+            line += (f" {r['p95_ms'] - before['p95_ms']:>+9.2f}"
+                     f" {r['throughput_rps'] - before['throughput_rps']:>+9.2f}")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--agora-latency", type=float, default=0.05, help="seconds, Agora + sipcm")
+    parser.add_argument("--firestore-latency", type=float, default=0.02, help="seconds per operation")
+    parser.add_argument("--fcm-latency", type=float, default=0.05, help="seconds per multicast")
+    parser.add_argument("--webhook-segments", type=int, default=100, help="files per webhook fileList")
+    parser.add_argument("--agora-qps", type=float, default=10000,
+                        help="app-side Agora rate limit per endpoint")
+    parser.add_argument("--asgi", action="store_true", help="serve through asgi.py instead of Flask")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--compare", help="JSON file from an earlier run to diff against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    app, server = load_app(args)
+    state = {"segments": args.webhook_segments}
+
+    routes = args.routes.split(",")
+    if args.asgi:
+        results = asyncio.run(run_routes_asgi(routes, args, state))
+    else:
+        results = {route: run_route(app, route, args, state) for route in routes}
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+    print_table(results, previous)
+
+    if args.output:
+        config = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "config": config, "results": results}, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
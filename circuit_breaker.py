@@ -0,0 +1,98 @@
+import threading
+import time
+
+import logs
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Circuit breaker
+# =========================================
+# closed -> open after `failure_threshold` consecutive failures (errors or
+# calls slower than `slow_call_seconds`); open -> half-open after
+# `reset_timeout`, letting one trial call through; the trial closes the
+# breaker again on success or re-opens it on failure. While open, callers
+# are refused immediately with CircuitOpen instead of waiting on a sick
+# upstream.
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit open, next trial in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0, slow_call_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+        self.transitions = 0
+        self.refused = 0
+        self.failures_total = 0
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        with self._lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.reset_timeout:
+                    self.refused += 1
+                    raise CircuitOpen(self.name, self.reset_timeout - waited)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    self.refused += 1
+                    raise CircuitOpen(self.name, 0.0)
+                self._trial_running = True
+
+    def record(self, ok, elapsed=None):
+        """Report the outcome of a call that before_call() let through."""
+        if ok and self.slow_call_seconds is not None and elapsed is not None:
+            ok = elapsed <= self.slow_call_seconds
+        with self._lock:
+            self._trial_running = False
+            if ok:
+                self._failures = 0
+                if self.state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self._failures += 1
+            self.failures_total += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self.state != OPEN:
+                    self._transition(OPEN)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": _STATE_VALUES[self.state],
+                "state_name": self.state,
+                "consecutive_failures": self._failures,
+                "failures_total": self.failures_total,
+                "refused": self.refused,
+                "transitions": self.transitions,
+            }
+
+    def _transition(self, state):
+        # caller holds the lock
+        log.warning("Circuit breaker state change", breaker=self.name, previous=self.state,
+                    state=state, consecutive_failures=self._failures)
+        self.state = state
+        self.transitions += 1
@@ -0,0 +1,85 @@
+import functools
+import json
+import os
+import threading
+import time
+
+
+# =========================================
+# Lazily created, memoized SDK clients
+# =========================================
+# Nothing here runs at import time: the google-cloud, firebase and twilio
+# SDKs are imported and their clients built on first use, so a cold start
+# only pays for what the first request actually touches.
+
+# name -> seconds the first call took (SDK import included)
+init_timings = {}
+
+
+def lazy(fn):
+    """Memoize a zero-argument factory; concurrent first calls build it once."""
+    lock = threading.Lock()
+    result = []
+
+    @functools.wraps(fn)
+    def wrapper():
+        if result:
+            return result[0]
+        with lock:
+            if not result:
+                started = time.perf_counter()
+                result.append(fn())
+                init_timings[fn.__name__] = round(time.perf_counter() - started, 4)
+        return result[0]
+
+    wrapper.initialized = lambda: bool(result)
+    return wrapper
+
+
+@lazy
+def gcs_credentials():
+    from google.oauth2 import service_account
+
+    service_account_info = json.loads(os.environ["GOOGLE_SERVICE_ACCOUNT"])
+    return service_account.Credentials.from_service_account_info(service_account_info)
+
+
+@lazy
+def storage_client():
+    from google.cloud import storage
+
+    return storage.Client(credentials=gcs_credentials())
+
+
+@lazy
+def firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials as firebase_credentials
+
+    service_account_info = json.loads(os.getenv("FIREBASE_SERVICE_ACCOUNT"))
+    # 🔥 Fix newline formatting
+    service_account_info["private_key"] = service_account_info["private_key"].replace("\\n", "\n")
+
+    return firebase_admin.initialize_app(firebase_credentials.Certificate(service_account_info))
+
+
+@lazy
+def db():
+    from firebase_admin import firestore
+
+    return firestore.client(app=firebase_app())
+
+
+@lazy
+def messaging():
+    from firebase_admin import messaging
+
+    firebase_app()
+    return messaging
+
+
+@lazy
+def twilio_client():
+    from twilio.rest import Client
+
+    return Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
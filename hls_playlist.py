@@ -0,0 +1,152 @@
+import hashlib
+import posixpath
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+import metrics
+from recording_stream import RecordingNotFound
+from singleflight import Group
+
+
+# =========================================
+# Signed HLS playlists
+# =========================================
+# Agora writes an .m3u8 next to its .ts segments with relative URIs. A
+# player can only use it once every segment URI is a signed URL, so the
+# playlist is fetched from the bucket, its URIs are rewritten in one
+# signing batch and the result is cached until shortly before the first
+# of those signatures expires. Polls in between cost neither a GCS read
+# nor any signing, and answer 304 when the client already has the body.
+# Playlists still being written (no #EXT-X-ENDLIST) are only cached briefly.
+
+EXPIRY_MARGIN = 300           # stop serving a playlist this long before a URL in it expires
+LIVE_TTL = 5                  # seconds a still-growing playlist is cached
+MAX_PLAYLISTS = 1000
+FETCH_TIMEOUT = (3.05, 10)
+
+_URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+
+
+class _Playlist:
+    def __init__(self, body, etag, expires_at):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class HlsPlaylists:
+    def __init__(self, get_signer, session, playlist_url_prefix="/recordings/hls/",
+                 expiry_margin=EXPIRY_MARGIN, live_ttl=LIVE_TTL, max_entries=MAX_PLAYLISTS):
+        # SignedUrlSigner factory, and the requests session used to read playlists
+        self.get_signer = get_signer
+        self.session = session
+        # Nested playlists point back at this endpoint instead of at GCS
+        self.playlist_url_prefix = playlist_url_prefix
+        self.expiry_margin = expiry_margin
+        self.live_ttl = live_ttl
+        self.max_entries = max_entries
+
+        self._cache = OrderedDict()    # playlist name -> _Playlist
+        self._lock = threading.Lock()
+        self._inflight = Group()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        """Return (body, etag, seconds it stays valid) for the playlist object `name`.
+
+        Raises RecordingNotFound when the bucket has no such playlist.
+        """
+        now = time.monotonic()
+        with self._lock:
+            playlist = self._cache.get(name)
+            if playlist and playlist.expires_at > now:
+                self._cache.move_to_end(name)
+                self.hits += 1
+                return playlist.body, playlist.etag, int(playlist.expires_at - now)
+            self.misses += 1
+
+        playlist = self._inflight.do(name, self._build, name)
+        return playlist.body, playlist.etag, int(max(0, playlist.expires_at - time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+    def _fetch(self, name):
+        url = self.get_signer().sign_many([name])[0]
+        with metrics.upstream("gcs", "get_playlist"):
+            resp = self.session.get(url, timeout=FETCH_TIMEOUT)
+        if resp.status_code == 404:
+            raise RecordingNotFound(name)
+        if resp.status_code != 200:
+            raise requests.HTTPError(f"GCS returned {resp.status_code} for {name}")
+        return resp.text
+
+    def _build(self, name):
+        text = self._fetch(name)
+        base_dir = posixpath.dirname(name)
+
+        def object_name(uri):
+            return posixpath.normpath(posixpath.join(base_dir, uri.split("?", 1)[0]))
+
+        def external(uri):
+            return "://" in uri
+
+        # Every object the playlist references, signed in one batch
+        lines = text.splitlines()
+        names = []
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                uris = [line]
+            elif line.startswith("#EXT"):
+                uris = _URI_ATTRIBUTE.findall(line)
+            else:
+                uris = []
+            names.extend(object_name(uri) for uri in uris
+                         if not external(uri) and not uri.endswith(".m3u8"))
+
+        urls, first_expiry = self.get_signer().sign_many_until(names)
+        signed = dict(zip(names, urls))
+
+        def rewrite(uri):
+            if external(uri):
+                return uri
+            if uri.endswith(".m3u8"):
+                return self.playlist_url_prefix + object_name(uri)
+            return signed[object_name(uri)]
+
+        out = []
+        for line in lines:
+            stripped = line.strip()
+            if stripped and not stripped.startswith("#"):
+                out.append(rewrite(stripped))
+            elif stripped.startswith("#EXT"):
+                out.append(_URI_ATTRIBUTE.sub(lambda m: f'URI="{rewrite(m.group(1))}"', line))
+            else:
+                out.append(line)
+        body = "\n".join(out) + "\n"
+
+        now = time.monotonic()
+        if "#EXT-X-ENDLIST" in text:
+            expires_at = (first_expiry or now + self.expiry_margin * 2) - self.expiry_margin
+        else:
+            expires_at = now + self.live_ttl
+        playlist = _Playlist(body, f'"{hashlib.sha1(body.encode()).hexdigest()[:20]}"',
+                             max(now, expires_at))
+
+        with self._lock:
+            self._cache[name] = playlist
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return playlist
@@ -0,0 +1,224 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+
+
+# =========================================
+# Structured, non-blocking logging
+# =========================================
+# One JSON object per line on stdout. Handlers only put the record on a
+# bounded queue; a background thread formats and writes it, so a slow
+# stdout never adds to request latency (when the queue is full, records
+# are dropped and counted instead of blocking). Every record carries the
+# request ID and Twilio call SID of the request (or task) that logged it.
+# Fields whose name looks like a secret (…token, …secret, authorization,
+# …key) are masked, and long strings/lists (fileList dumps, response
+# bodies) are truncated. High-volume success lines can be sampled.
+#
+#     log = logs.get_logger(__name__)
+#     log.info("Webhook received", event_type=31, sample=logs.HOT_PATH_SAMPLE)
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of routine per-request lines kept on hot paths (errors are never sampled)
+HOT_PATH_SAMPLE = float(os.environ.get("LOG_SAMPLE_RATE", "0.1"))
+QUEUE_SIZE = 10000
+MAX_STRING = 512
+MAX_ITEMS = 10
+MAX_DEPTH = 4
+SECRET_SUFFIXES = ("token", "tokens", "secret", "password", "authorization", "credentials", "key")
+
+request_id = contextvars.ContextVar("request_id", default=None)
+call_sid = contextvars.ContextVar("call_sid", default=None)
+
+
+def mask(value):
+    if isinstance(value, (list, tuple)):
+        return [mask(v) for v in value]
+    if isinstance(value, str) and len(value) > 12:
+        return f"{value[:6]}…({len(value)})"
+    return "[redacted]"
+
+
+def sanitize(value, key=None, depth=0):
+    """Redact secret-looking keys and cut `value` down to a loggable size."""
+    if key is not None and value is not None and str(key).lower().endswith(SECRET_SUFFIXES):
+        return mask(value)
+    if isinstance(value, dict):
+        if depth >= MAX_DEPTH:
+            return f"{{…{len(value)} keys}}"
+        return {str(k): sanitize(v, k, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [sanitize(v, None, depth + 1) for v in list(value)[:MAX_ITEMS]]
+        if len(value) > MAX_ITEMS:
+            items.append(f"…(+{len(value) - MAX_ITEMS} more)")
+        return items
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else repr(value) if isinstance(value, Exception) else str(value)
+    return text if len(text) <= MAX_STRING else f"{text[:MAX_STRING]}…(+{len(text) - MAX_STRING} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in ("request_id", "call_sid"):
+            value = getattr(record, name, None)
+            if value:
+                entry[name] = value
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(sanitize(fields))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ContextFilter(logging.Filter):
+    # Runs in the logging thread, where the request's context vars are set
+    def filter(self, record):
+        record.request_id = request_id.get()
+        record.call_sid = call_sid.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only what can't wait: resolve the message and traceback now,
+        # leave JSON formatting and redaction to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructLogger(logging.LoggerAdapter):
+    """logger.info("msg", key=value, ..., sample=0.1): keywords become JSON fields."""
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def log(self, level, msg, *args, exc_info=None, stack_info=False, sample=1.0, **fields):
+        if not self.isEnabledFor(level):
+            return
+        if sample < 1.0:
+            if random.random() >= sample:
+                return
+            fields["sample_rate"] = sample
+        self.logger.log(level, msg, *args, exc_info=exc_info, stack_info=stack_info,
+                        extra={"fields": fields})
+
+
+_handler = None
+_listener = None
+
+
+def configure():
+    """Route the root logger through the background writer (idempotent)."""
+    global _handler, _listener
+    if _handler is not None:
+        return
+    q = queue.Queue(QUEUE_SIZE)
+    _handler = _QueueHandler(q)
+    _handler.addFilter(_ContextFilter())
+
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(q, writer)
+    _listener.start()
+    # Drain whatever is still queued before the process exits
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+
+
+def get_logger(name):
+    configure()
+    return StructLogger(logging.getLogger(name))
+
+
+def bind(request=None, call=None):
+    """Set the request ID / call SID for everything logged from this context."""
+    tokens = []
+    if request is not None:
+        tokens.append(request_id.set(request))
+    if call is not None:
+        tokens.append(call_sid.set(call))
+    return tokens
+
+
+def unbind(tokens):
+    for token in reversed(tokens):
+        try:
+            token.var.reset(token)
+        except ValueError:
+            # bound in another context (e.g. a copied one); just clear it
+            token.var.set(None)
+
+
+def new_request_id(headers):
+    """Caller's / Vercel's request ID when there is one, else a fresh one."""
+    for name in ("X-Request-ID", "X-Vercel-Id"):
+        value = headers.get(name) or headers.get(name.lower())
+        if value:
+            return value
+    return uuid.uuid4().hex[:16]
+
+
+def stats():
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
+
+
+def init_app(app):
+    """Bind request ID + call SID per Flask request and echo X-Request-ID."""
+    from flask import g, request
+
+    @app.before_request
+    def _bind_request():
+        body = request.get_json(silent=True) if request.is_json else None
+        body = body if isinstance(body, dict) else {}
+        g._log_request_id = new_request_id(request.headers)
+        g._log_tokens = bind(
+            request=g._log_request_id,
+            call=request.values.get("CallSid") or body.get("callSid") or body.get("call_sid"),
+        )
+
+    @app.after_request
+    def _echo_request_id(response):
+        if "_log_request_id" in g:
+            response.headers["X-Request-ID"] = g._log_request_id
+        return response
+
+    @app.teardown_request
+    def _unbind(exc):
+        unbind(g.pop("_log_tokens", []))
@@ -0,0 +1,209 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import logs
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Prometheus-style metrics
+# =========================================
+# A small in-process registry rendered in the Prometheus text format at
+# /metrics: per-route request latency/status/in-flight, and per-upstream
+# call latency/outcome (Agora REST, sipcm, Firestore, FCM, GCS signing,
+# Twilio).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, labels)} {value}" for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}    # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = []
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, ('le', bound))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+# -----------------------------------------
+# Registry
+# -----------------------------------------
+_metrics = []
+_sources = []    # (prefix, fn returning {name: number})
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_source(prefix, fn):
+    """Export the numeric values of `fn()` (e.g. a cache's stats()) as gauges."""
+    _sources.append((prefix, fn))
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for prefix, fn in _sources:
+        try:
+            values = fn()
+        except Exception as e:
+            log.warning("Metrics source failed", source=prefix, error=e)
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+HTTP_LATENCY = _register(Histogram(
+    "http_request_duration_seconds", "Flask request latency by route",
+    ("route", "method", "status"),
+))
+HTTP_REQUESTS = _register(Counter(
+    "http_requests_total", "Flask requests by route and status",
+    ("route", "method", "status"),
+))
+HTTP_IN_FLIGHT = _register(Gauge(
+    "http_requests_in_flight", "Flask requests currently being handled", ("route",),
+))
+UPSTREAM_LATENCY = _register(Histogram(
+    "upstream_request_duration_seconds", "Upstream call latency",
+    ("upstream", "operation", "outcome"),
+))
+UPSTREAM_CALLS = _register(Counter(
+    "upstream_requests_total", "Upstream calls by outcome",
+    ("upstream", "operation", "outcome"),
+))
+
+
+@contextmanager
+def upstream(name, operation):
+    """Time one upstream call; an exception counts as outcome="error"."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_LATENCY.observe(elapsed, name, operation, outcome)
+        UPSTREAM_CALLS.inc(name, operation, outcome)
+
+
+def observe_upstream(name, operation, elapsed, outcome):
+    """Record an upstream call timed by the caller (e.g. with retries)."""
+    UPSTREAM_LATENCY.observe(elapsed, name, operation, outcome)
+    UPSTREAM_CALLS.inc(name, operation, outcome)
+
+
+# -----------------------------------------
+# Flask hooks
+# -----------------------------------------
+def init_app(app):
+    from flask import Response, g, request
+
+    def route_label():
+        return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        g._metrics_route = route_label()
+        HTTP_IN_FLIGHT.inc(g._metrics_route)
+
+    @app.after_request
+    def _record(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            labels = (g._metrics_route, request.method, str(response.status_code))
+            HTTP_LATENCY.observe(time.perf_counter() - started, *labels)
+            HTTP_REQUESTS.inc(*labels)
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        route = g.pop("_metrics_route", None)
+        if route is not None:
+            HTTP_IN_FLIGHT.dec(route)
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
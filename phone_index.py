@@ -0,0 +1,141 @@
+import threading
+import time
+
+import metrics
+
+
+# =========================================
+# phoneNumber -> (userId, FCM tokens) index
+# =========================================
+# Process-local copy of the `users` collection keyed by phone number, so the
+# inbound path does not query Firestore on every ring. It is filled and kept
+# current by an on_snapshot listener. Only a complete index is trusted:
+# until the first snapshot arrives, when the listener isn't running, or
+# once the index hit its memory ceiling, every lookup runs a query, and
+# query results are not cached (nothing would keep them current).
+
+MAX_ENTRIES = 100000
+
+
+def _tokens_from(user_data):
+    # Docs saved before multi-device support only have the single fcmToken
+    if 'fcmTokens' in user_data:
+        return list(user_data.get('fcmTokens') or [])
+    single = user_data.get('fcmToken')
+    return [single] if single else []
+
+
+class PhoneIndex:
+    def __init__(self, collection, max_entries=MAX_ENTRIES):
+        self.collection = collection
+        self.max_entries = max_entries
+
+        self._by_phone = {}    # phone -> (user_id, [tokens])
+        self._phone_of = {}    # user_id -> phone
+        self._lock = threading.Lock()
+        self._watch = None
+
+        self.ready = False
+        self.truncated = False
+        self.last_snapshot_at = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    # -----------------------------------------
+    # Listener
+    # -----------------------------------------
+    def start(self):
+        """Attach the snapshot listener; its first snapshot loads every user."""
+        if self._watch is None:
+            self._watch = self.collection.on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    self._remove(doc.id)
+                else:
+                    data = doc.to_dict() or {}
+                    self._put(doc.id, data.get('phoneNumber'), _tokens_from(data))
+            self.ready = True
+            self.last_snapshot_at = time.time()
+
+    # -----------------------------------------
+    # Reads / writes
+    # -----------------------------------------
+    def lookup(self, phone_number):
+        """Return (user_id, [fcm tokens]) for `phone_number`, or None."""
+        with self._lock:
+            if self.ready and not self.truncated:
+                self.hits += 1
+                return self._by_phone.get(phone_number)
+            self.fallbacks += 1
+
+        from google.cloud.firestore_v1 import FieldFilter
+        with metrics.upstream("firestore", "users_by_phone"):
+            docs = self.collection.where(filter=FieldFilter('phoneNumber', '==', phone_number)).limit(1).get()
+        if not docs:
+            return None
+        user_doc = docs[0]
+        return (user_doc.id, _tokens_from(user_doc.to_dict() or {}))
+
+    # Writes we just made ourselves, applied ahead of the listener. Only
+    # users the snapshot already gave us are touched: anything else would
+    # be a partial entry (e.g. just the one token saved), and the listener
+    # delivers the full document shortly anyway.
+    def add_token(self, user_id, phone_number, token):
+        """Add one device token to the user's set (mirrors an ArrayUnion write)."""
+        with self._lock:
+            old_phone = self._phone_of.get(user_id)
+            if not self.ready or old_phone is None:
+                return
+            tokens = [t for t in self._by_phone[old_phone][1] if t != token]
+            self._put(user_id, phone_number, tokens + [token])
+
+    def remove_tokens(self, user_id, tokens):
+        """Drop device tokens from the user's set (mirrors an ArrayRemove write)."""
+        with self._lock:
+            phone_number = self._phone_of.get(user_id)
+            if not self.ready or phone_number is None:
+                return
+            remaining = [t for t in self._by_phone[phone_number][1] if t not in tokens]
+            self._by_phone[phone_number] = (user_id, remaining)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._by_phone),
+                "ready": self.ready,
+                "truncated": self.truncated,
+                "staleness_seconds": (
+                    None if self.last_snapshot_at is None
+                    else round(time.time() - self.last_snapshot_at, 3)
+                ),
+                "hits": self.hits,
+                "fallbacks": self.fallbacks,
+            }
+
+    # caller holds the lock for both helpers
+    def _put(self, user_id, phone_number, tokens):
+        old_phone = self._phone_of.get(user_id)
+        if old_phone is not None and old_phone != phone_number:
+            self._by_phone.pop(old_phone, None)
+            del self._phone_of[user_id]
+        if not phone_number:
+            return
+        if phone_number not in self._by_phone and len(self._by_phone) >= self.max_entries:
+            self.truncated = True
+            return
+        self._by_phone[phone_number] = (user_id, tokens)
+        self._phone_of[user_id] = phone_number
+
+    def _remove(self, user_id):
+        phone_number = self._phone_of.pop(user_id, None)
+        if phone_number is not None:
+            self._by_phone.pop(phone_number, None)
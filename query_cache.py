@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+from singleflight import Group
+
+
+# =========================================
+# Recording status (/query) cache
+# =========================================
+# Clients poll /query for the same resourceId/sid many times a second.
+# Identical polls share one in-flight Agora query, and a successful answer
+# is reused for `ttl` seconds. Anything that changes the recording (/stop,
+# a recording webhook for the sid) invalidates it; a query that was already
+# in flight when that happened is returned to its callers but not cached.
+
+QUERY_CACHE_TTL = 2.0         # seconds a status answer is reused
+MAX_ENTRIES = 1000
+
+
+class _Entry:
+    def __init__(self, response, fetched_at):
+        self.response = response
+        self.fetched_at = fetched_at
+
+
+class RecordingQueryCache:
+    def __init__(self, ttl=QUERY_CACHE_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()      # (resource_id, sid) -> _Entry
+        self._generations = OrderedDict()  # sid -> bumped on every invalidation
+        self._lock = threading.Lock()
+        self._inflight = Group()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, resource_id, sid, fetch):
+        """Return (response, age in seconds, hit, cached) for this recording.
+
+        `fetch()` (the Agora query) only runs on a miss, once for all
+        concurrent misses on the same key. `cached` is False when the
+        answer may not be reused (an error, or invalidated meanwhile).
+        """
+        cached = self.peek(resource_id, sid)
+        if cached is not None:
+            return cached[0], cached[1], True, True
+
+        generation = self.generation(sid)
+        key = (resource_id, sid)
+        response, stored = self._inflight.do(key, self._fetch, key, fetch, generation)
+        return response, 0.0, False, stored
+
+    def peek(self, resource_id, sid):
+        """(response, age) when cached and fresh, else None (counted as a miss).
+
+        asgi.py fetches misses itself and hands them back through `store`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((resource_id, sid))
+            if entry and now - entry.fetched_at < self.ttl:
+                self.hits += 1
+                return entry.response, now - entry.fetched_at
+            self.misses += 1
+        return None
+
+    def generation(self, sid):
+        with self._lock:
+            return self._generations.get(sid, 0)
+
+    def store(self, resource_id, sid, response, generation):
+        """Cache an Agora query response unless it failed or `sid` was
+        invalidated since `generation` was read; returns (response, cached)."""
+        if response.status_code != 200:
+            return response, False
+        with self._lock:
+            if self._generations.get(sid, 0) != generation:
+                return response, False
+            self._entries[(resource_id, sid)] = _Entry(response, time.monotonic())
+            self._entries.move_to_end((resource_id, sid))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response, True
+
+    def invalidate(self, sid):
+        """Forget every cached status for `sid` (stopped, or a webhook arrived)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == sid]:
+                del self._entries[key]
+            self._generations[sid] = self._generations.get(sid, 0) + 1
+            self._generations.move_to_end(sid)
+            while len(self._generations) > self.max_entries:
+                self._generations.popitem(last=False)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+    def _fetch(self, key, fetch, generation):
+        return self.store(key[0], key[1], fetch(), generation)
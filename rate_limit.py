@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+
+# =========================================
+# Agora QPS limiting / admission control
+# =========================================
+# Agora caps cloud_recording acquire/start/stop/query QPS per App ID. Each
+# endpoint class gets a token bucket (rate + burst); a call over the limit
+# waits for its slot instead of collecting a 429, as long as fewer than
+# `max_queue` calls are already waiting and the slot comes within
+# `max_wait` seconds. Otherwise it is refused with RateLimited straight away.
+#
+# The App ID limit is shared by every process. Each process enforces
+# rate / `split` (e.g. split = number of gunicorn workers/instances), so the
+# sum stays under Agora's limit without a shared backend.
+
+DEFAULT_RATES = {"acquire": 10, "start": 10, "stop": 10, "query": 10}
+DEFAULT_MAX_QUEUE = 50
+DEFAULT_MAX_WAIT = 5.0        # seconds
+
+
+def parse_rates(spec):
+    """"acquire=10,start=10" -> {"acquire": 10.0, "start": 10.0}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        endpoint, _, rate = item.partition("=")
+        rates[endpoint.strip()] = float(rate)
+    return rates
+
+
+class RateLimited(Exception):
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"Agora {endpoint} rate limit: queue full, retry in {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    def __init__(self, rate, burst):
+        self.interval = 1.0 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self.next_at = 0.0            # theoretical arrival time of the next call
+
+        self.queued = 0
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seen = 0.0
+
+
+class RateLimiter:
+    def __init__(self, rates=None, split=1, burst=None, max_queue=DEFAULT_MAX_QUEUE,
+                 max_wait=DEFAULT_MAX_WAIT):
+        rates = DEFAULT_RATES if rates is None else rates
+        self.split = max(1, int(split))
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+        for endpoint, rate in rates.items():
+            share = rate / self.split
+            # Burst defaults to one second's worth of this process's share
+            self._buckets[endpoint] = _Bucket(share, max(1, int(burst or share)))
+
+    def reserve(self, endpoint):
+        """Claim the next slot for `endpoint`; returns the seconds to wait for it.
+
+        A return > 0 counts as queued until `release(endpoint)`. Raises
+        RateLimited when the queue is full or the slot is beyond `max_wait`.
+        Endpoints without a configured rate are never limited.
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            arrival = max(bucket.next_at, now)
+            delay = max(0.0, arrival - bucket.tolerance - now)
+            if delay > 0 and (bucket.queued >= self.max_queue or delay > self.max_wait):
+                bucket.rejected += 1
+                raise RateLimited(endpoint, delay)
+
+            bucket.next_at = arrival + bucket.interval
+            bucket.admitted += 1
+            if delay > 0:
+                bucket.queued += 1
+                bucket.delayed += 1
+                bucket.wait_seconds += delay
+                bucket.max_wait_seen = max(bucket.max_wait_seen, delay)
+            return delay
+
+    def release(self, endpoint):
+        with self._lock:
+            self._buckets[endpoint].queued -= 1
+
+    def wait(self, endpoint):
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                self.release(endpoint)
+
+    async def wait_async(self, endpoint):
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.release(endpoint)
+
+    def stats(self):
+        with self._lock:
+            stats = {"split": self.split, "max_queue": self.max_queue, "max_wait": self.max_wait}
+            for endpoint, bucket in self._buckets.items():
+                stats.update({
+                    f"{endpoint}_rate": round(1.0 / bucket.interval, 3),
+                    f"{endpoint}_queued": bucket.queued,
+                    f"{endpoint}_admitted": bucket.admitted,
+                    f"{endpoint}_delayed": bucket.delayed,
+                    f"{endpoint}_rejected": bucket.rejected,
+                    f"{endpoint}_wait_seconds_total": round(bucket.wait_seconds, 3),
+                    f"{endpoint}_max_wait_seconds": round(bucket.max_wait_seen, 3),
+                })
+            return stats
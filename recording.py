@@ -0,0 +1,217 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Cloud recording orchestration
+# =========================================
+# Runs acquire + start server-side in one go and remembers resourceId/sid
+# per call SID in the session store, so a call's recording can be stopped
+# later from just its SID (e.g. from Twilio's status callback).
+
+BULK_STOP_WORKERS = 8         # concurrent Agora stop calls per bulk stop
+# Agora answers these when the recording already ended on its own
+# (idle timeout / no data), so there is nothing left to stop
+ALREADY_STOPPED_CODES = (404, 435)
+
+
+class RecordingError(Exception):
+    def __init__(self, step, status_code, body):
+        super().__init__(f"Agora {step} failed ({status_code}): {body}")
+        self.step = step
+        self.status_code = status_code
+        self.body = body
+
+
+def build_start_payload(channel, uid, token, storage_config):
+    return {
+        "cname": channel,
+        "uid": uid,
+        "clientRequest": {
+            "token": token,  # Add RTC token here if your channel requires it
+            "recordingConfig": {
+                "maxIdleTime": 300,           # 5 minutes idle timeout
+                "streamTypes": 3,             # 3 = audio only (recommended for calls; use 2 if you want video too)
+                "channelType": 0,             # 0 = communication mode
+                "audioProfile": 0,            # Default audio quality
+                "audioCodecProfile": 0,
+                "postponeTranscoding": True,   # Helps with MP4 generation
+                "enableAudioAnnouncement": True,
+            },
+            "recordingFileConfig": {
+                "avFileType": ["hls", "mp4"]  # Required for MP4 output in mix mode
+            },
+            "storageConfig": storage_config
+        }
+    }
+
+
+class RecordingOrchestrator:
+    def __init__(self, agora, sessions, storage_config, resource_pool=None, on_stopped=None):
+        self.agora = agora
+        self.sessions = sessions
+        self.storage_config = storage_config
+        self.resource_pool = resource_pool
+        # called with the sid of every recording stopped here
+        self.on_stopped = on_stopped
+
+        # call SIDs with a start/stop currently running, so duplicate
+        # status callbacks don't start two recordings for one call
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def _claim(self, call_sid):
+        with self._lock:
+            if call_sid in self._busy:
+                return False
+            self._busy.add(call_sid)
+            return True
+
+    def _release(self, call_sid):
+        with self._lock:
+            self._busy.discard(call_sid)
+
+    def start(self, call_sid, channel, uid, token):
+        """Acquire a resource and start mix-mode recording for `call_sid`.
+
+        Returns the session (with resourceId and sid). If the call is
+        already being recorded the existing session is returned unchanged.
+        """
+        session = self.sessions.get(call_sid)
+        if session and session.get('recording') == 'started':
+            return session
+        if not self._claim(call_sid):
+            return self.sessions.get(call_sid)
+
+        try:
+            self.sessions.put(call_sid, stop_requested=False)
+            resource_id = self.resource_pool.take(channel, uid) if self.resource_pool else None
+            if not resource_id:
+                acquired = self.agora.acquire(channel, uid)
+                body = acquired.json()
+                resource_id = body.get("resourceId")
+                if acquired.status_code != 200 or not resource_id:
+                    raise RecordingError("acquire", acquired.status_code, body)
+
+            payload = build_start_payload(channel, uid, token, self.storage_config)
+            started = self.agora.start(resource_id, payload)
+            body = started.json()
+            if started.status_code != 200 or not body.get("sid"):
+                raise RecordingError("start", started.status_code, body)
+
+            log.info("Recording started", call_sid=call_sid, resource_id=resource_id, sid=body["sid"])
+            session = self.sessions.put(
+                call_sid,
+                channel=channel,
+                uid=uid,
+                resourceId=resource_id,
+                sid=body["sid"],
+                recording='started',
+                recording_started_at=time.time(),
+            )
+        finally:
+            self._release(call_sid)
+
+        # The call ended while we were still starting
+        if session.get('stop_requested'):
+            try:
+                self.stop(call_sid)
+            except RecordingError as e:
+                # Still marked started, so the sweeper retries it
+                log.warning("Deferred recording stop failed", call_sid=call_sid, error=e)
+            session = self.sessions.get(call_sid)
+        return session
+
+    def stop(self, call_sid):
+        """Stop the recording tracked for `call_sid`; returns Agora's body or None.
+
+        Raises RecordingError when Agora refuses the stop; the session then
+        stays marked as recording, so a later stop (or the sweeper) retries.
+        """
+        if not self._claim(call_sid):
+            # A start is in flight; it stops the recording once it lands
+            self.sessions.put(call_sid, stop_requested=True)
+            return None
+
+        session = self.sessions.get(call_sid)
+        if not session or session.get('recording') != 'started':
+            self._release(call_sid)
+            return None
+
+        try:
+            stopped = self.agora.stop(session['resourceId'], session['sid'],
+                                      session['channel'], session['uid'])
+            body = stopped.json()
+            log.info("Recording stop response", call_sid=call_sid, sid=session["sid"],
+                     status=stopped.status_code, agora=body)
+            if stopped.status_code != 200 and stopped.status_code not in ALREADY_STOPPED_CODES:
+                raise RecordingError("stop", stopped.status_code, body)
+            self.sessions.put(call_sid, recording='stopped', recording_stopped_at=time.time(),
+                              stop_requested=False)
+            if self.on_stopped:
+                self.on_stopped(session['sid'])
+            return body
+        finally:
+            self._release(call_sid)
+
+    def stop_many(self, targets, workers=BULK_STOP_WORKERS):
+        """Stop several recordings concurrently; returns one result per target, in order.
+
+        A target is a call SID tracked here, or a dict with either
+        "callSid" or the raw "resourceId"/"sid"/"channel"/"uid" of a
+        recording this instance may not know about. Each result has a
+        "status": stopped, already_stopped, stop_requested, not_recording
+        or error.
+        """
+        if not targets:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(targets)),
+                                thread_name_prefix="recording-stop") as pool:
+            return list(pool.map(self._stop_target, targets))
+
+    def _stop_target(self, target):
+        if isinstance(target, str):
+            target = {"callSid": target}
+        result = {key: target[key] for key in ("callSid", "resourceId", "sid") if target.get(key)}
+        try:
+            if target.get("callSid"):
+                try:
+                    body = self.stop(target["callSid"])
+                except RecordingError as e:
+                    log.warning("Recording stop failed", target=target, error=e)
+                    result.update(status="error", error=str(e), agora=e.body)
+                    return result
+                if body is not None:
+                    result.update(status="stopped", agora=body)
+                elif (self.sessions.get(target["callSid"]) or {}).get("stop_requested"):
+                    result["status"] = "stop_requested"
+                else:
+                    result["status"] = "not_recording"
+                return result
+
+            stopped = self.agora.stop(target["resourceId"], target["sid"],
+                                      target["channel"], str(target.get("uid", "0")))
+            body = stopped.json()
+            result["agora"] = body
+            if stopped.status_code == 200:
+                result["status"] = "stopped"
+            elif stopped.status_code in ALREADY_STOPPED_CODES:
+                result["status"] = "already_stopped"
+            else:
+                result["status"] = "error"
+                return result
+            for session_id, _ in self.sessions.find(sid=target["sid"]):
+                self.sessions.put(session_id, recording='stopped', recording_stopped_at=time.time())
+            if self.on_stopped:
+                self.on_stopped(target["sid"])
+        except Exception as e:
+            log.warning("Recording stop failed", target=target, error=e)
+            result.update(status="error", error=str(e))
+            if getattr(e, "retry_after", None) is not None:
+                result["retryAfter"] = e.retry_after
+        return result
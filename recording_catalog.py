@@ -0,0 +1,152 @@
+import base64
+import datetime
+
+import metrics
+
+
+# =========================================
+# Recording catalog
+# =========================================
+# One Firestore document per recording (keyed by Agora sid) built from the
+# recording webhooks: channel, sid, resourceId, uid, caller phone number,
+# files with sizes, start time and duration. Lookups by channel / phone /
+# time range page through that collection with a cursor instead of listing
+# the bucket.
+#
+# Filtering on channel or phoneNumber together with a startedAt range
+# needs composite indexes (channel+startedAt, phoneNumber+startedAt,
+# channel+phoneNumber+startedAt, all startedAt descending).
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _as_datetime(value):
+    """Epoch seconds/ms or an ISO 8601 string -> aware UTC datetime (None passes through)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+    if seconds > 1e11:   # milliseconds
+        seconds /= 1000
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+
+
+def encode_cursor(doc_id):
+    return base64.urlsafe_b64encode(doc_id.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+
+
+def file_entries(file_list):
+    """Agora fileList items -> what the catalog keeps per file."""
+    entries = []
+    for file_info in file_list:
+        if not file_info.get("fileName"):
+            continue
+        entry = {
+            "fileName": file_info["fileName"],
+            "size": file_info.get("fileSize", file_info.get("size")),
+            "trackType": file_info.get("trackType"),
+            "sliceStartTime": file_info.get("sliceStartTime"),
+        }
+        entries.append({k: v for k, v in entry.items() if v is not None})
+    return entries
+
+
+class RecordingCatalog:
+    def __init__(self, get_db, collection_name='recordings'):
+        # Firestore client factory, only called on first use
+        self.get_db = get_db
+        self.collection_name = collection_name
+
+    def _collection(self):
+        return self.get_db().collection(self.collection_name)
+
+    def index(self, event, session=None):
+        """Upsert the catalog entry for the recording a webhook `event` is about.
+
+        `session` is the call session tracking this sid, if any; it supplies
+        what Agora's callback doesn't carry (resourceId, caller, timestamps).
+        Returns the sid indexed, or None when the event names no recording.
+        """
+        from firebase_admin import firestore
+
+        payload = event.get("payload") or {}
+        details = payload.get("details") or {}
+        sid = payload.get("sid") or event.get("sid")
+        if not sid:
+            return None
+        session = session or {}
+
+        files = file_entries(payload.get("fileList") or details.get("fileList") or [])
+        started_at = _as_datetime(session.get("recording_started_at"))
+        stopped_at = _as_datetime(session.get("recording_stopped_at"))
+        if started_at is None:
+            slice_starts = [f["sliceStartTime"] for f in files if f.get("sliceStartTime")]
+            started_at = _as_datetime(min(slice_starts)) if slice_starts else None
+
+        entry = {
+            "sid": sid,
+            "channel": payload.get("cname") or session.get("channel"),
+            "uid": payload.get("uid") or session.get("uid"),
+            "resourceId": session.get("resourceId"),
+            "phoneNumber": session.get("from_number"),
+            "callSid": session.get("callSid"),
+            "lastEventType": event.get("eventType"),
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+        }
+        if started_at:
+            entry["startedAt"] = started_at
+        if started_at and stopped_at:
+            entry["durationSeconds"] = round((stopped_at - started_at).total_seconds(), 3)
+        if files:
+            # Uploads arrive over several callbacks; keep every file seen
+            entry["files"] = firestore.ArrayUnion(files)
+        entry = {k: v for k, v in entry.items() if v is not None}
+
+        with metrics.upstream("firestore", "catalog_index"):
+            self._collection().document(sid).set(entry, merge=True)
+        return sid
+
+    def search(self, channel=None, phone_number=None, since=None, until=None,
+               limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """Newest-first page of recordings; returns (entries, next cursor or None)."""
+        from google.cloud.firestore_v1 import FieldFilter, Query
+
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        query = self._collection()
+        if channel:
+            query = query.where(filter=FieldFilter('channel', '==', channel))
+        if phone_number:
+            query = query.where(filter=FieldFilter('phoneNumber', '==', phone_number))
+        if since:
+            query = query.where(filter=FieldFilter('startedAt', '>=', _as_datetime(since)))
+        if until:
+            query = query.where(filter=FieldFilter('startedAt', '<', _as_datetime(until)))
+        query = query.order_by('startedAt', direction=Query.DESCENDING)
+
+        with metrics.upstream("firestore", "catalog_search"):
+            if cursor:
+                last = self._collection().document(decode_cursor(cursor)).get()
+                if last.exists:
+                    query = query.start_after(last)
+            # One extra document tells us whether there is a next page
+            docs = list(query.limit(limit + 1).stream())
+
+        entries = []
+        for doc in docs[:limit]:
+            entry = doc.to_dict()
+            for key in ("startedAt", "updatedAt"):
+                if isinstance(entry.get(key), datetime.datetime):
+                    entry[key] = entry[key].isoformat()
+            entries.append(entry)
+        next_cursor = encode_cursor(docs[limit - 1].id) if len(docs) > limit else None
+        return entries, next_cursor
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+
+# =========================================
+# Streaming recording downloads
+# =========================================
+# Proxies a recording object from the bucket without buffering it: the
+# object URL is signed locally (see recording_urls.py), the client's Range
+# and conditional headers are passed through to GCS, and the body is
+# relayed chunk by chunk, so a stream holds one chunk in memory whatever
+# the file size. GCS answers Range (206/416) and ETag/Last-Modified
+# revalidation (304) itself.
+
+CHUNK_SIZE = 256 * 1024
+TIMEOUT = (3.05, 30)          # (connect, read between chunks)
+
+# Request headers forwarded to GCS / response headers relayed to the client
+FORWARD_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since", "If-Match")
+RELAY_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges",
+                 "ETag", "Last-Modified")
+RELAY_STATUS = {200, 206, 304, 412, 416}
+
+
+class RecordingNotFound(Exception):
+    pass
+
+
+class RecordingStreamer:
+    def __init__(self, get_signer, allowed_prefix="records/", chunk_size=CHUNK_SIZE, pool_size=20):
+        # SignedUrlSigner factory, only called on the first stream
+        self.get_signer = get_signer
+        self.allowed_prefix = allowed_prefix
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self.active = 0
+        self.streamed_bytes = 0
+
+    def valid_name(self, file_name):
+        parts = file_name.split("/")
+        return file_name.startswith(self.allowed_prefix) and ".." not in parts and "" not in parts
+
+    def open(self, file_name, request_headers):
+        """Start fetching `file_name`; returns (status, headers, body chunk iterator).
+
+        Raises RecordingNotFound for a name outside the recordings prefix or
+        missing from the bucket.
+        """
+        if not self.valid_name(file_name):
+            raise RecordingNotFound(file_name)
+
+        url = self.get_signer().sign_many([file_name])[0]
+        headers = {name: request_headers[name] for name in FORWARD_HEADERS if name in request_headers}
+
+        started = time.perf_counter()
+        try:
+            upstream = self.session.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+        except requests.RequestException:
+            metrics.observe_upstream("gcs", "stream_object", time.perf_counter() - started, "error")
+            raise
+        metrics.observe_upstream("gcs", "stream_object", time.perf_counter() - started,
+                                 "ok" if upstream.status_code in RELAY_STATUS else "error")
+
+        if upstream.status_code not in RELAY_STATUS:
+            upstream.close()
+            if upstream.status_code == 404:
+                raise RecordingNotFound(file_name)
+            raise requests.HTTPError(f"GCS returned {upstream.status_code} for {file_name}")
+
+        relayed = {name: upstream.headers[name] for name in RELAY_HEADERS if name in upstream.headers}
+        relayed.setdefault("Accept-Ranges", "bytes")
+        return upstream.status_code, relayed, _Relay(self, upstream)
+
+    def stats(self):
+        with self._lock:
+            return {"active_streams": self.active, "streamed_bytes": self.streamed_bytes}
+
+
+class _Relay:
+    """Body iterable for one stream; close() (called by the WSGI server even
+    when the body was never read, e.g. HEAD) releases the GCS connection."""
+
+    def __init__(self, streamer, upstream):
+        self.streamer = streamer
+        self.upstream = upstream
+        self.closed = False
+        with streamer._lock:
+            streamer.active += 1
+
+    def __iter__(self):
+        for chunk in self.upstream.iter_content(chunk_size=self.streamer.chunk_size):
+            with self.streamer._lock:
+                self.streamer.streamed_bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with self.streamer._lock:
+            self.streamer.active -= 1
+        self.upstream.close()
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import logs
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Stale recording sweeper
+# =========================================
+# A mix-mode recording keeps running (and billing) until it is stopped or
+# sits idle for maxIdleTime. When a call ends without its stop going
+# through (stop failed, instance restarted mid-call, no status callback)
+# the recording is orphaned. Every `interval` seconds this looks for
+# sessions still marked recording whose call ended more than
+# `ended_grace` seconds ago, or whose recording is older than `max_age`,
+# and stops them in batches through RecordingOrchestrator.stop_many.
+
+SWEEP_INTERVAL = 60           # seconds between sweeps
+ENDED_GRACE = 30              # leave the normal stop path this long after a call ends
+MAX_RECORDING_AGE = 4 * 3600  # stop any recording running longer than this
+SWEEP_BATCH_SIZE = 20
+
+
+class RecordingSweeper:
+    def __init__(self, recorder, sessions, interval=SWEEP_INTERVAL, ended_grace=ENDED_GRACE,
+                 max_age=MAX_RECORDING_AGE, batch_size=SWEEP_BATCH_SIZE):
+        self.recorder = recorder
+        self.sessions = sessions
+        self.interval = interval
+        self.ended_grace = ended_grace
+        self.max_age = max_age
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.sweeps = 0
+        self.stopped = 0
+        self.errors = 0
+        self.last_candidates = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="recording-sweeper", daemon=True)
+            self._thread.start()
+
+    def stale(self, now=None):
+        """Session ids whose recording should already have been stopped."""
+        now = time.time() if now is None else now
+        stale = []
+        for session_id, session in self.sessions.find(recording='started'):
+            ended_at = session.get('ended_at') or session.get('updated_at', now)
+            started_at = session.get('recording_started_at') or session.get('created_at', now)
+            if session.get('status') == 'ended' and now - ended_at >= self.ended_grace:
+                stale.append(session_id)
+            elif now - started_at >= self.max_age:
+                stale.append(session_id)
+        return stale
+
+    def sweep(self):
+        """Stop every stale recording now; returns the per-session results."""
+        candidates = self.stale()
+        results = []
+        for i in range(0, len(candidates), self.batch_size):
+            results.extend(self.recorder.stop_many(candidates[i:i + self.batch_size]))
+
+        stopped = sum(1 for result in results if result["status"] in ("stopped", "already_stopped"))
+        errors = sum(1 for result in results if result["status"] == "error")
+        with self._lock:
+            self.sweeps += 1
+            self.last_candidates = len(candidates)
+            self.stopped += stopped
+            self.errors += errors
+        if candidates:
+            log.info("Recording sweep", stale=len(candidates), stopped=stopped, failed=errors)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sweeps": self.sweeps,
+                "last_candidates": self.last_candidates,
+                "stopped": self.stopped,
+                "errors": self.errors,
+            }
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                log.exception("Recording sweep failed", error=e)
@@ -0,0 +1,114 @@
+import binascii
+import datetime
+import hashlib
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+import metrics
+
+
+# =========================================
+# Batch V4 signed URLs for recording files
+# =========================================
+# Signing is done locally with the service-account key: one timestamp and
+# credential scope per batch, then one RSA signature per file. No network.
+
+STORAGE_ENDPOINT = "https://storage.googleapis.com"
+SIGNED_URL_EXPIRATION = datetime.timedelta(hours=1)
+
+# Hand out a cached URL only while it still has at least this long to live
+CACHE_MIN_REMAINING = datetime.timedelta(minutes=10)
+CACHE_MAX_ENTRIES = 50000
+
+
+def _quote_param(value):
+    return urllib.parse.quote(str(value), safe="~")
+
+
+class SignedUrlSigner:
+    def __init__(self, credentials, bucket_name, expiration=SIGNED_URL_EXPIRATION,
+                 endpoint=STORAGE_ENDPOINT, max_entries=CACHE_MAX_ENTRIES):
+        self.credentials = credentials
+        self.bucket_name = bucket_name
+        self.expiration = expiration
+        self.endpoint = endpoint
+        self.host = urllib.parse.urlparse(endpoint).netloc
+        self.max_entries = max_entries
+
+        # file_name -> (url, expires_at monotonic)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sign_many(self, file_names, _request_time=None):
+        """Return a signed GET URL for every name in `file_names`, in order.
+
+        Names with a cached URL that is not close to expiry are served from
+        the cache; the rest are signed together in one pass.
+        """
+        return self.sign_many_until(file_names, _request_time)[0]
+
+    def sign_many_until(self, file_names, _request_time=None):
+        """sign_many, plus the monotonic time the first of the returned URLs expires."""
+        now = time.monotonic()
+        min_remaining = CACHE_MIN_REMAINING.total_seconds()
+        urls = {}
+        missing = {}
+
+        with self._lock:
+            for name in file_names:
+                if name in urls:
+                    continue
+                cached = self._cache.get(name)
+                if cached and cached[1] - now > min_remaining:
+                    self._cache.move_to_end(name)
+                    urls[name] = cached
+                    self.hits += 1
+                else:
+                    missing[name] = None
+            self.misses += len(missing)
+
+        if missing:
+            with metrics.upstream("gcs", "sign_urls"):
+                signed = self._sign_batch(list(missing), _request_time)
+            expires_at = now + self.expiration.total_seconds()
+            with self._lock:
+                for name, url in signed.items():
+                    self._cache[name] = urls[name] = (url, expires_at)
+                    self._cache.move_to_end(name)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+        first_expiry = min((urls[name][1] for name in file_names), default=None)
+        return [urls[name][0] for name in file_names], first_expiry
+
+    def _sign_batch(self, file_names, request_time=None):
+        request_time = request_time or datetime.datetime.now(datetime.timezone.utc)
+        request_timestamp = request_time.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = request_timestamp[:8]
+
+        credential_scope = f"{datestamp}/auto/storage/goog4_request"
+        query_string = "&".join(sorted([
+            f"X-Goog-Algorithm={_quote_param('GOOG4-RSA-SHA256')}",
+            f"X-Goog-Credential={_quote_param(f'{self.credentials.signer_email}/{credential_scope}')}",
+            f"X-Goog-Date={_quote_param(request_timestamp)}",
+            f"X-Goog-Expires={_quote_param(int(self.expiration.total_seconds()))}",
+            f"X-Goog-SignedHeaders={_quote_param('host')}",
+        ]))
+        string_prefix = f"GOOG4-RSA-SHA256\n{request_timestamp}\n{credential_scope}\n"
+        request_suffix = f"\n{query_string}\nhost:{self.host}\n\nhost\nUNSIGNED-PAYLOAD"
+
+        signed = {}
+        for name in file_names:
+            resource = f"/{self.bucket_name}/{urllib.parse.quote(name, safe='/~')}"
+            canonical_request = f"GET\n{resource}{request_suffix}"
+            request_hash = hashlib.sha256(canonical_request.encode("ascii")).hexdigest()
+            signature = self.credentials.sign_bytes((string_prefix + request_hash).encode("ascii"))
+            signed[name] = (
+                f"{self.endpoint}{resource}?{query_string}"
+                f"&X-Goog-Signature={binascii.hexlify(signature).decode('ascii')}"
+            )
+        return signed
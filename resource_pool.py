@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+
+import logs
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Pre-acquired cloud_recording resourceIds
+# =========================================
+# A resourceId from cloud_recording/acquire is bound to one (cname, uid) and
+# must be used by /start within 5 minutes. Keeping a few warm per channel
+# template takes the acquire round trip out of recording start. Entries are
+# dropped a safety margin before Agora's window closes. Configured channels
+# are pinned; any other (channel, uid) is only tracked once it keeps
+# missing, so one-off channels don't cost background acquires.
+
+RESOURCE_VALIDITY = 300       # seconds Agora keeps an acquired resourceId
+SAFETY_MARGIN = 60            # never hand out one older than validity - margin
+TARGET_SIZE = 2               # warm entries kept per (channel, uid)
+MAX_SIZE = 10                 # hard cap per (channel, uid)
+REFILL_INTERVAL = 5           # seconds between refill passes
+TEMPLATE_IDLE = 600           # stop refilling a non-pinned template unused this long
+MAX_TEMPLATES = 50
+TRACK_AFTER_MISSES = 3        # misses within MISS_WINDOW before a template is tracked
+MISS_WINDOW = 300
+MAX_MISS_KEYS = 1000
+
+
+class ResourcePool:
+    def __init__(self, agora, target_size=TARGET_SIZE, max_size=MAX_SIZE,
+                 validity=RESOURCE_VALIDITY, safety_margin=SAFETY_MARGIN,
+                 refill_interval=REFILL_INTERVAL):
+        self.agora = agora
+        self.target_size = min(target_size, max_size)
+        self.max_size = max_size
+        self.max_age = validity - safety_margin
+        self.refill_interval = refill_interval
+
+        self._pools = {}              # (channel, uid) -> deque[(resource_id, acquired_at)]
+        self._last_used = {}          # (channel, uid) -> monotonic time of last take()
+        self._pinned = set()          # templates warmed from config, never dropped
+        self._recent_misses = {}      # untracked (channel, uid) -> (first miss, count)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._refiller = None
+
+        self.hits = 0
+        self.misses = 0
+        self.acquired = 0
+        self.acquire_errors = 0
+        self.expired = 0
+        self._started_at = time.monotonic()
+
+    def warm(self, channel, uid, pinned=True):
+        """Start keeping resourceIds ready for (channel, uid).
+
+        Templates that are not pinned are dropped again after TEMPLATE_IDLE
+        seconds without a take().
+        """
+        key = (channel, str(uid))
+        with self._lock:
+            if key not in self._pools and len(self._pools) >= MAX_TEMPLATES:
+                return
+            self._pools.setdefault(key, deque())
+            self._last_used.setdefault(key, time.monotonic())
+            if pinned:
+                self._pinned.add(key)
+        self._ensure_refiller()
+        self._wake.set()
+
+    def take(self, channel, uid):
+        """Return a still-valid pre-acquired resourceId, or None on a miss."""
+        key = (channel, str(uid))
+        now = time.monotonic()
+        resource_id = None
+        with self._lock:
+            pool = self._pools.get(key)
+            tracked = pool is not None
+            if tracked:
+                self._last_used[key] = now
+            while pool:
+                candidate, acquired_at = pool.popleft()
+                if now - acquired_at < self.max_age:
+                    resource_id = candidate
+                    break
+                self.expired += 1
+            if resource_id:
+                self.hits += 1
+            else:
+                self.misses += 1
+            track = tracked or self._note_miss(key, now)
+        # Refill what we just used, or start tracking a template that keeps missing
+        if track:
+            self.warm(channel, uid, pinned=False)
+        return resource_id
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            minutes = max((time.monotonic() - self._started_at) / 60, 1e-9)
+            return {
+                "templates": len(self._pools),
+                "ready": sum(len(pool) for pool in self._pools.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "acquired": self.acquired,
+                "acquire_errors": self.acquire_errors,
+                "expired": self.expired,
+                "fill_rate_per_minute": round(self.acquired / minutes, 3),
+            }
+
+    def _note_miss(self, key, now):
+        # caller holds the lock; True once an untracked key missed often enough
+        first, count = self._recent_misses.get(key, (now, 0))
+        if now - first > MISS_WINDOW:
+            first, count = now, 0
+        count += 1
+        if count >= TRACK_AFTER_MISSES:
+            self._recent_misses.pop(key, None)
+            return True
+        self._recent_misses[key] = (first, count)
+        if len(self._recent_misses) > MAX_MISS_KEYS:
+            for stale in [k for k, (t, _) in self._recent_misses.items() if now - t > MISS_WINDOW]:
+                del self._recent_misses[stale]
+            if len(self._recent_misses) > MAX_MISS_KEYS:
+                self._recent_misses.pop(next(iter(self._recent_misses)))
+        return False
+
+    # -----------------------------------------
+    # Background refill
+    # -----------------------------------------
+    def _ensure_refiller(self):
+        if self._refiller is not None:
+            return
+        with self._lock:
+            if self._refiller is not None:
+                return
+            self._refiller = threading.Thread(target=self._refill_loop, name="resource-pool", daemon=True)
+            self._refiller.start()
+
+    def _refill_loop(self):
+        while True:
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+            self._refill()
+
+    def _refill(self):
+        now = time.monotonic()
+        wanted = []
+        with self._lock:
+            for key in list(self._pools):
+                if key not in self._pinned and now - self._last_used[key] > TEMPLATE_IDLE:
+                    del self._pools[key]
+                    del self._last_used[key]
+            for key, pool in self._pools.items():
+                while pool and now - pool[0][1] >= self.max_age:
+                    pool.popleft()
+                    self.expired += 1
+                missing = self.target_size - len(pool)
+                if missing > 0:
+                    wanted.append((key, missing))
+
+        for (channel, uid), missing in wanted:
+            for _ in range(missing):
+                try:
+                    response = self.agora.acquire(channel, uid)
+                    resource_id = response.json().get("resourceId")
+                except Exception as e:
+                    resource_id = None
+                    log.warning("Resource pool acquire failed", channel=channel, uid=uid, error=e)
+                if not resource_id:
+                    with self._lock:
+                        self.acquire_errors += 1
+                    break
+                with self._lock:
+                    pool = self._pools.get((channel, uid))
+                    if pool is not None and len(pool) < self.max_size:
+                        pool.append((resource_id, time.monotonic()))
+                    self.acquired += 1
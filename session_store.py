@@ -0,0 +1,189 @@
+import atexit
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+import logs
+import metrics
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Call / recording session store
+# =========================================
+# Holds per-call state (call SID, channel, resourceId, sid, status,
+# timestamps). The memory backend is bounded by TTL and entry count; the
+# Firestore backend keeps the same bounded memory copy in front and writes
+# changes behind to the `active_calls` collection in batches.
+
+SESSION_TTL = 6 * 3600        # seconds since last update before a session is dropped
+MAX_SESSIONS = 10000
+FLUSH_INTERVAL = 1.0          # seconds between write-behind flushes
+FLUSH_BATCH_SIZE = 100        # flush early once this many sessions are dirty
+FIRESTORE_BATCH_LIMIT = 500
+
+_DELETED = object()
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=SESSION_TTL, max_entries=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()   # oldest update first
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session['updated_at'] > self.ttl:
+                del self._sessions[session_id]
+                self.evicted += 1
+                return None
+            return dict(session)
+
+    def put(self, session_id, **fields):
+        """Merge `fields` into the session and return the updated copy."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.pop(session_id, None) or {'created_at': now}
+            session.update(fields)
+            session['updated_at'] = now
+            self._sessions[session_id] = session
+            self._evict(now)
+            return dict(session)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def find(self, **criteria):
+        """Return [(session_id, session)] whose fields equal every criterion."""
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            return [
+                (session_id, dict(session))
+                for session_id, session in self._sessions.items()
+                if all(session.get(k) == v for k, v in criteria.items())
+            ]
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, now):
+        # caller holds the lock; entries are ordered by last update
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_entries and now - session['updated_at'] <= self.ttl:
+                break
+            del self._sessions[session_id]
+            self.evicted += 1
+
+
+class FirestoreSessionStore(MemorySessionStore):
+    def __init__(self, get_db, collection_name='active_calls', ttl=SESSION_TTL,
+                 max_entries=MAX_SESSIONS, flush_interval=FLUSH_INTERVAL,
+                 flush_batch_size=FLUSH_BATCH_SIZE):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        # Firestore client factory, only called once a session needs it
+        self.get_db = get_db
+        self.collection_name = collection_name
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+
+        self._dirty = {}                 # session_id -> fields to merge, or _DELETED
+        self._dirty_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def get(self, session_id):
+        session = super().get(session_id)
+        if session is not None:
+            return session
+        # Not in memory (evicted, or written by another instance)
+        with metrics.upstream("firestore", "session_get"):
+            doc = self.get_db().collection(self.collection_name).document(session_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        data.pop('expireAt', None)
+        data.setdefault('created_at', time.time())
+        data.setdefault('updated_at', data['created_at'])
+        with self._lock:
+            self._sessions[session_id] = data
+            self._sessions.move_to_end(session_id)
+        return dict(data)
+
+    def put(self, session_id, **fields):
+        session = super().put(session_id, **fields)
+        self._mark_dirty(session_id, session)
+        return session
+
+    def delete(self, session_id):
+        super().delete(session_id)
+        self._mark_dirty(session_id, _DELETED)
+
+    def _mark_dirty(self, session_id, session):
+        with self._dirty_lock:
+            self._dirty[session_id] = session
+            pending = len(self._dirty)
+        if pending >= self.flush_batch_size:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every dirty session to Firestore now."""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+
+        items = list(dirty.items())
+        for i in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            chunk = items[i:i + FIRESTORE_BATCH_LIMIT]
+            db = self.get_db()
+            batch = db.batch()
+            for session_id, session in chunk:
+                doc_ref = db.collection(self.collection_name).document(session_id)
+                if session is _DELETED:
+                    batch.delete(doc_ref)
+                else:
+                    # expireAt lets a Firestore TTL policy clean up old docs
+                    expire_at = datetime.datetime.fromtimestamp(
+                        session['updated_at'] + self.ttl, datetime.timezone.utc
+                    )
+                    batch.set(doc_ref, dict(session, expireAt=expire_at), merge=True)
+            try:
+                with metrics.upstream("firestore", "session_flush"):
+                    batch.commit()
+                self.flushed += len(chunk)
+            except Exception as e:
+                self.flush_errors += 1
+                log.warning("Session flush failed", sessions=len(chunk), error=e)
+                # Put them back unless a newer change arrived meanwhile
+                with self._dirty_lock:
+                    for session_id, session in chunk:
+                        self._dirty.setdefault(session_id, session)
+
+
+def create_session_store(backend, get_db=None):
+    if backend == "firestore":
+        return FirestoreSessionStore(get_db)
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
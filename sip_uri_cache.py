@@ -0,0 +1,210 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import logs
+from singleflight import Group
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Inbound SIP URI cache
+# =========================================
+# sipcm hands out the same inbound SIP URI for a given channel/region/token,
+# so answers are cached per (channel, region, token fingerprint). Concurrent
+# misses for one key share a single sipcm request, and a background thread
+# refreshes entries that are still being used before they expire.
+#
+# The newest good answer per (channel, region) is also kept past its TTL,
+# as the last-known-good URI /inbound falls back to when sipcm is down or
+# too slow to answer within the call's latency budget.
+
+SIP_URI_TTL = 1800            # seconds an answer is served from cache
+REFRESH_AHEAD = 300           # refresh hot entries this long before expiry
+HOT_WINDOW = 900              # an entry is hot if read within this many seconds
+REFRESH_INTERVAL = 30         # how often the refresher wakes up
+MAX_ENTRIES = 500
+
+
+def token_fingerprint(token):
+    return hashlib.sha256((token or "").encode()).hexdigest()[:16]
+
+
+class _Entry:
+    def __init__(self, channel, region, token, data, fetched_at):
+        self.channel = channel
+        self.region = region
+        self.token = token
+        self.data = data
+        self.fetched_at = fetched_at
+        self.last_used = fetched_at
+
+
+class SipUriCache:
+    def __init__(self, sipcm, ttl=SIP_URI_TTL, refresh_ahead=REFRESH_AHEAD,
+                 hot_window=HOT_WINDOW, refresh_interval=REFRESH_INTERVAL,
+                 max_entries=MAX_ENTRIES):
+        self.sipcm = sipcm
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.hot_window = hot_window
+        self.refresh_interval = refresh_interval
+        self.max_entries = max_entries
+
+        self._entries = {}
+        self._last_good = OrderedDict()    # (channel, region) -> sipcm response body
+        self._lock = threading.Lock()
+        self._inflight = Group()
+        self._refresher = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.stale_served = 0
+        self.unavailable = 0
+
+    def get(self, channel, region, token):
+        """Return the sipcm response body (with "sip") for this channel/region/token.
+
+        Raises `agora_client.SipcmError` (or a requests exception) on a miss
+        that sipcm could not answer.
+        """
+        data = self.peek(channel, region, token)
+        if data is not None:
+            return data
+        return self.fetch(channel, region, token)
+
+    def fetch(self, channel, region, token):
+        """Fetch and cache this entry from sipcm (shared with concurrent misses)."""
+        key = (channel, region, token_fingerprint(token))
+        self._ensure_refresher()
+        entry = self._inflight.do(key, self._fetch, key, channel, region, token)
+        entry.last_used = time.monotonic()
+        return entry.data
+
+    def last_known_good(self, channel, region):
+        """Newest answer sipcm gave for this channel/region, however old, or None."""
+        with self._lock:
+            data = self._last_good.get((channel, region))
+            if data is None:
+                self.unavailable += 1
+            else:
+                self.stale_served += 1
+            return data
+
+    def peek(self, channel, region, token):
+        """Return the cached answer, or None (counted as a miss) without fetching.
+
+        Used by asgi.py, which fetches misses itself with the async sipcm
+        client and hands the answer back through `store`.
+        """
+        key = (channel, region, token_fingerprint(token))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry.fetched_at < self.ttl:
+                entry.last_used = now
+                self.hits += 1
+                return entry.data
+            self.misses += 1
+        return None
+
+    def store(self, channel, region, token, data):
+        """Cache a sipcm answer fetched outside this class; returns it."""
+        key = (channel, region, token_fingerprint(token))
+        self._ensure_refresher()
+        self._store(key, channel, region, token, data)
+        return data
+
+    def prewarm(self, channel, region, token):
+        """Fetch an entry in the background so the first call finds it cached."""
+        self._ensure_refresher()
+        key = (channel, region, token_fingerprint(token))
+        threading.Thread(
+            target=self._refresh_one, args=(key, channel, region, token),
+            name="sip-uri-prewarm", daemon=True
+        ).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "stale_served": self.stale_served,
+                "unavailable": self.unavailable,
+            }
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+    def _fetch(self, key, channel, region, token):
+        data = self.sipcm.inbound_sip(channel, token, region)
+        return self._store(key, channel, region, token, data)
+
+    def _store(self, key, channel, region, token, data):
+        entry = _Entry(channel, region, token, data, time.monotonic())
+        if data.get("sip"):
+            with self._lock:
+                previous = self._entries.get(key)
+                if previous:
+                    entry.last_used = previous.last_used
+                self._entries[key] = entry
+                self._evict()
+                self._last_good[(channel, region)] = data
+                self._last_good.move_to_end((channel, region))
+                while len(self._last_good) > self.max_entries:
+                    self._last_good.popitem(last=False)
+        return entry
+
+    def _evict(self):
+        # caller holds the lock
+        if len(self._entries) <= self.max_entries:
+            return
+        by_use = sorted(self._entries.items(), key=lambda item: item[1].last_used)
+        for key, _ in by_use[:len(self._entries) - self.max_entries]:
+            del self._entries[key]
+
+    def _refresh_one(self, key, channel, region, token):
+        try:
+            self._inflight.do(key, self._fetch, key, channel, region, token)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            log.warning("SIP URI refresh failed", channel=channel, region=region, error=e)
+
+    def _ensure_refresher(self):
+        if self._refresher is not None:
+            return
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="sip-uri-refresher", daemon=True
+            )
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            now = time.monotonic()
+            with self._lock:
+                due = []
+                for key, entry in list(self._entries.items()):
+                    if now - entry.last_used > self.hot_window:
+                        # Cold entries are left to expire
+                        if now - entry.fetched_at >= self.ttl:
+                            del self._entries[key]
+                        continue
+                    if now - entry.fetched_at >= self.ttl - self.refresh_ahead:
+                        due.append((key, entry))
+            for key, entry in due:
+                self._refresh_one(key, entry.channel, entry.region, entry.token)
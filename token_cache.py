@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+from agora_token_builder import RtcTokenBuilder
+
+
+# =========================================
+# In-process RTC token cache
+# =========================================
+# Tokens are valid for 24 hours, so building a fresh one (HMAC) per request
+# is wasted work. Entries are keyed by (channel, uid, role), LRU bounded,
+# and rebuilt once they get within REFRESH_MARGIN of expiry.
+
+TOKEN_TTL = 86400            # seconds a token stays valid
+REFRESH_MARGIN = 3600        # rebuild this long before expiry
+MAX_ENTRIES = 1000
+
+
+class TokenEntry:
+    def __init__(self, token, expires_at):
+        self.token = token
+        self.expires_at = expires_at
+
+    def expires_in(self, now=None):
+        return max(0, int(self.expires_at - (now or time.time())))
+
+
+class RtcTokenCache:
+    def __init__(self, app_id, app_certificate, ttl=TOKEN_TTL,
+                 refresh_margin=REFRESH_MARGIN, max_entries=MAX_ENTRIES):
+        self.app_id = app_id
+        self.app_certificate = app_certificate
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, channel, uid, role):
+        """Return a `TokenEntry` for (channel, uid, role), building one if needed."""
+        key = (channel, uid, role)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.expires_at - now > self.refresh_margin:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        expires_at = int(now) + self.ttl
+        token = RtcTokenBuilder.buildTokenWithUid(
+            self.app_id,
+            self.app_certificate,
+            channel,
+            uid,
+            role,
+            expires_at
+        )
+        entry = TokenEntry(token, expires_at)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
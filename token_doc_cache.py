@@ -0,0 +1,115 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+# =========================================
+# agora_tokens read-through cache
+# =========================================
+# Apps poll /get-agora-token, but a token document only changes when the
+# token rotates. Documents are kept in process (the writes this instance
+# makes go straight into the cache) and re-read from Firestore at most
+# every `ttl` seconds, so another instance's rotation shows up within
+# that time. Each answer carries a strong ETag of the response body and
+# how long the token stays usable, for ETag/304 and Cache-Control.
+
+READ_TTL = 30                 # seconds before a cached doc is re-read from Firestore
+MISSING_TTL = 5               # seconds a missing doc is remembered
+EXPIRY_MARGIN = 300           # clients stop caching a token this long before it expires
+MAX_ENTRIES = 5000
+
+
+def expiry_epoch(value):
+    """expiresAt as stored (epoch s/ms or a Firestore timestamp) -> epoch seconds, or None."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    seconds = float(value)
+    return seconds / 1000 if seconds > 1e11 else seconds
+
+
+class TokenDoc:
+    def __init__(self, body, fetched_at):
+        # body: the /get-agora-token response, or None when there is no doc
+        self.body = body
+        self.fetched_at = fetched_at
+        self.expires_at = expiry_epoch(body.get("expiresAt")) if body else None
+        self.etag = '"%s"' % hashlib.sha256(
+            json.dumps(body, sort_keys=True, default=str).encode()
+        ).hexdigest()[:32]
+
+    def max_age(self, margin=EXPIRY_MARGIN, now=None):
+        """Seconds a client may reuse this token without asking; None if unknown."""
+        if self.expires_at is None:
+            return None
+        return max(0, int(self.expires_at - margin - (now or time.time())))
+
+
+class TokenDocCache:
+    def __init__(self, get_db, collection_name='agora_tokens', ttl=READ_TTL,
+                 missing_ttl=MISSING_TTL, max_entries=MAX_ENTRIES):
+        # Firestore client factory, only called on a miss
+        self.get_db = get_db
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.max_entries = max_entries
+
+        self._docs = OrderedDict()         # doc_id -> TokenDoc
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, doc_id):
+        """TokenDoc for `doc_id` (its body is None when Firestore has no such doc)."""
+        now = time.monotonic()
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc and now - doc.fetched_at < (self.ttl if doc.body else self.missing_ttl):
+                self._docs.move_to_end(doc_id)
+                self.hits += 1
+                return doc
+            self.misses += 1
+
+        with metrics.upstream("firestore", "get_agora_token"):
+            snapshot = self.get_db().collection(self.collection_name).document(doc_id).get()
+        return self._store(doc_id, self.response_body(snapshot.to_dict()) if snapshot.exists else None,
+                           read_started=now)
+
+    def put(self, doc_id, data):
+        """Record a write made by this instance, so reads see it before Firestore does."""
+        return self._store(doc_id, self.response_body(data))
+
+    @staticmethod
+    def response_body(data):
+        return {
+            "success": True,
+            "token": data.get('rtcToken'),
+            "channel": data.get('channel'),
+            "uid": data.get('uid'),
+            "expiresAt": data.get('expiresAt'),
+        }
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._docs), "hits": self.hits, "misses": self.misses}
+
+    def _store(self, doc_id, body, read_started=None):
+        doc = TokenDoc(body, time.monotonic())
+        with self._lock:
+            current = self._docs.get(doc_id)
+            if read_started is not None and current and current.fetched_at >= read_started:
+                # put() landed while we were reading; keep the newer doc
+                return current
+            self._docs[doc_id] = doc
+            self._docs.move_to_end(doc_id)
+            while len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+        return doc
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import logs
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Durable webhook ingestion
+# =========================================
+# Agora retries a callback that is not answered quickly, so the webhook
+# routes only validate, spool and acknowledge. Each event is written to a
+# local SQLite spool (WAL, so it survives a process crash) and handled later
+# by a small worker pool. Every worker process shares the spool file, so
+# the database is what keeps them apart: a UNIQUE dedup key drops retries
+# of an event any process already has (same Agora noticeId, or the same
+# sid + eventType), and a worker claims a row (pending -> processing)
+# before handling it. Each row carries a lease held by the process that
+# owns it; rows whose lease ran out (their process died) are taken over
+# on start and whenever the workers are idle.
+
+SPOOL_PATH = "/tmp/webhook_spool.sqlite3"
+DEFAULT_WORKERS = 2
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_BASE = 1.0     # seconds, doubled per attempt
+LEASE_SECONDS = 300          # a row untouched this long past its due time is orphaned
+DONE_RETENTION = 3600        # processed rows are kept (and deduplicated against) this long
+RECOVER_INTERVAL = 60        # seconds between orphan checks while idle
+RECENT_FAILURES = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_status ON events (status, id);
+"""
+
+_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS events_dedup_key ON events (dedup_key);
+CREATE INDEX IF NOT EXISTS events_lease ON events (status, lease_until);
+"""
+
+
+def dedup_key(kind, event, raw=b""):
+    """Agora's noticeId when present, else sid + eventType, else the body hash."""
+    if event.get("noticeId"):
+        return f"{kind}:{event['noticeId']}"
+    payload = event.get("payload") if isinstance(event.get("payload"), dict) else {}
+    sid = event.get("sid") or payload.get("sid") or event.get("callid")
+    event_type = event.get("eventType") or event.get("event")
+    if sid and event_type:
+        return f"{kind}:{sid}:{event_type}"
+    return f"{kind}:{hashlib.sha256(raw or json.dumps(event, sort_keys=True).encode()).hexdigest()}"
+
+
+class WebhookQueue:
+    def __init__(self, handlers, path=SPOOL_PATH, workers=DEFAULT_WORKERS,
+                 max_attempts=MAX_ATTEMPTS, lease_seconds=LEASE_SECONDS):
+        # kind -> fn(event dict); raising schedules a retry
+        self.handlers = handlers
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+        self._db = None
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queue = deque()            # (due monotonic, row id)
+        self._threads = []
+        self._last_cleanup = 0.0
+        self._last_recover = 0.0
+
+        self.accepted = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.recovered = 0
+        self.claimed_elsewhere = 0
+        # (timestamp, kind, error) for the most recent failed attempts
+        self.recent_failures = deque(maxlen=RECENT_FAILURES)
+
+    def enqueue(self, kind, event, raw=b""):
+        """Spool one event; returns False when it is a duplicate of a recent one.
+
+        `raw` is the request body `event` was parsed from; it is stored as is.
+        """
+        key = dedup_key(kind, event, raw)
+        self._ensure_started()
+
+        with self._lock:
+            now = time.time()
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO events (kind, dedup_key, payload, received_at, lease_until) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, key, raw.decode("utf-8") if raw else json.dumps(event), now,
+                 now + self.lease_seconds),
+            )
+            self._db.commit()
+            if cursor.rowcount == 0:
+                # Some process already spooled this event
+                self.duplicates += 1
+                return False
+            self._queue.append((0.0, cursor.lastrowid))
+            self.accepted += 1
+            self._ready.notify()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._queue),
+                "accepted": self.accepted,
+                "duplicates": self.duplicates,
+                "processed": self.processed,
+                "retried": self.retried,
+                "failed": self.failed,
+                "recovered": self.recovered,
+                "claimed_elsewhere": self.claimed_elsewhere,
+                "recent_failures": list(self.recent_failures),
+            }
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+    def _ensure_started(self):
+        if self._db is not None:
+            return
+        with self._lock:
+            if self._db is not None:
+                return
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL + NORMAL: a committed event survives the process dying,
+            # without an fsync on every webhook
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            _migrate(db)
+            db.executescript(_INDEXES)
+
+            # Take over what a dead process left behind
+            self._db = db
+            self._recover()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"webhook-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _recover(self):
+        # caller holds the lock (or is _ensure_started). BEGIN IMMEDIATE takes
+        # the write lock, so two processes can't both take over the same rows.
+        now = time.time()
+        self._last_recover = time.monotonic()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            orphaned = [row_id for (row_id,) in self._db.execute(
+                "SELECT id FROM events WHERE status IN ('pending', 'processing') AND lease_until < ? "
+                "ORDER BY id", (now,))]
+            self._db.executemany(
+                "UPDATE events SET status = 'pending', lease_until = ? WHERE id = ?",
+                [(now + self.lease_seconds, row_id) for row_id in orphaned])
+            self._db.commit()
+        except Exception:
+            self._db.rollback()
+            raise
+        for row_id in orphaned:
+            self._queue.append((0.0, row_id))
+        self.recovered += len(orphaned)
+        if orphaned:
+            log.info("Recovered orphaned webhook events", count=len(orphaned))
+
+    def _claim(self, row_id):
+        # caller holds the lock; None when another process got the row first
+        cursor = self._db.execute(
+            "UPDATE events SET status = 'processing', lease_until = ? WHERE id = ? AND status = 'pending'",
+            (time.time() + self.lease_seconds, row_id))
+        self._db.commit()
+        if cursor.rowcount == 0:
+            self.claimed_elsewhere += 1
+            return None
+        return self._db.execute(
+            "SELECT kind, payload, attempts FROM events WHERE id = ?", (row_id,)
+        ).fetchone()
+
+    def _next(self):
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                for i, (due, row_id) in enumerate(self._queue):
+                    if due <= now:
+                        del self._queue[i]
+                        row = self._claim(row_id)
+                        if row:
+                            return row_id, row
+                        break
+                else:
+                    waits = [due - now for due, _ in self._queue]
+                    self._ready.wait(min(waits + [RECOVER_INTERVAL]))
+                    if not self._queue:
+                        self._idle()
+
+    def _work(self):
+        while True:
+            row_id, (kind, payload, attempts) = self._next()
+            handler = self.handlers.get(kind)
+            try:
+                if handler is None:
+                    raise LookupError(f"no handler for {kind!r} events")
+                handler(json.loads(payload))
+            except Exception as e:
+                self._failed(row_id, kind, attempts + 1, e)
+            else:
+                with self._lock:
+                    self._db.execute("UPDATE events SET status = 'done', attempts = ? WHERE id = ?",
+                                     (attempts + 1, row_id))
+                    self._db.commit()
+                    self.processed += 1
+
+    def _failed(self, row_id, kind, attempts, error):
+        # Called from the except block, so the traceback is still available
+        log.warning("Webhook processing failed", kind=kind, event_id=row_id, attempt=attempts,
+                    error=error, exc_info=True)
+        with self._lock:
+            self.recent_failures.append((time.time(), kind, repr(error)))
+            if attempts >= self.max_attempts:
+                status = 'failed'
+                self.failed += 1
+            else:
+                status = 'pending'
+                self.retried += 1
+                delay = RETRY_BACKOFF_BASE * (2 ** (attempts - 1))
+                self._queue.append((time.monotonic() + delay, row_id))
+                self._ready.notify()
+            # A retry stays leased to this process until it is due (plus the lease)
+            lease_until = time.time() + self.lease_seconds + (delay if status == 'pending' else 0)
+            self._db.execute(
+                "UPDATE events SET status = ?, attempts = ?, last_error = ?, lease_until = ? WHERE id = ?",
+                (status, attempts, repr(error), lease_until, row_id))
+            self._db.commit()
+
+    def _idle(self):
+        # caller holds the lock; runs when the workers are idle
+        if time.monotonic() - self._last_recover >= RECOVER_INTERVAL:
+            self._recover()
+        if time.monotonic() - self._last_cleanup < DONE_RETENTION / 4:
+            return
+        self._last_cleanup = time.monotonic()
+        self._db.execute("DELETE FROM events WHERE status = 'done' AND received_at < ?",
+                         (time.time() - DONE_RETENTION,))
+        self._db.commit()
+
+
+def _migrate(db):
+    # Spools written before rows carried a lease: add the column and drop
+    # duplicate keys so the UNIQUE index can be built
+    columns = {name for _, name, *_ in db.execute("PRAGMA table_info(events)")}
+    if "lease_until" in columns:
+        return
+    db.execute("ALTER TABLE events ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+    db.execute("DELETE FROM events WHERE id NOT IN (SELECT MIN(id) FROM events GROUP BY dedup_key)")
+    db.commit()
@@ -0,0 +1,172 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+import logs
+import metrics
+
+log = logs.get_logger(__name__)
+
+
+# =========================================
+# Firestore write-behind buffer
+# =========================================
+# Small merge-writes that callers don't need to wait for (device tokens,
+# inbound RTC tokens) are queued here instead of each doing its own
+# set(). Writes to the same document before the next flush coalesce into
+# one; a write whose content fingerprint matches the last one queued for
+# that document within `fingerprint_ttl` seconds is skipped outright (the
+# TTL bounds how long a skip can be wrong when the document was changed
+# elsewhere, e.g. pruned by another instance). Pending writes go out in WriteBatches
+# every `flush_interval` seconds, as soon as `flush_size` documents are
+# waiting, and once more at interpreter exit.
+
+FLUSH_INTERVAL = 0.5          # seconds between flushes
+FLUSH_SIZE = 200              # flush early once this many documents are pending
+FIRESTORE_BATCH_LIMIT = 500
+MAX_FINGERPRINTS = 20000
+FINGERPRINT_TTL = 300         # seconds a fingerprint can turn a write into a no-op
+
+
+def _coalesce(pending, fields):
+    """Merge `fields` into a pending merge-write for the same document."""
+    from google.cloud.firestore_v1.transforms import ArrayUnion
+
+    merged = dict(pending)
+    for key, value in fields.items():
+        previous = merged.get(key)
+        if isinstance(value, ArrayUnion) and isinstance(previous, ArrayUnion):
+            value = ArrayUnion(list(previous.values) +
+                               [v for v in value.values if v not in previous.values])
+        merged[key] = value
+    return merged
+
+
+class WriteBuffer:
+    def __init__(self, get_db, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE,
+                 max_fingerprints=MAX_FINGERPRINTS, fingerprint_ttl=FINGERPRINT_TTL):
+        # Firestore client factory, only called on the first flush
+        self.get_db = get_db
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_fingerprints = max_fingerprints
+        self.fingerprint_ttl = fingerprint_ttl
+
+        self._pending = {}                 # (collection, doc_id) -> fields to merge
+        self._fingerprints = OrderedDict() # (collection, doc_id) -> (fingerprint, monotonic queued at)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        atexit.register(self.flush)
+
+        self.queued = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def set(self, collection, doc_id, fields, fingerprint=None):
+        """Queue `doc_ref.set(fields, merge=True)`; returns False if skipped as a no-op.
+
+        `fingerprint` is whatever identifies the write's content (e.g. the
+        token); the same fingerprint twice in a row for a document within
+        `fingerprint_ttl` is dropped, so timestamp-only rewrites don't reach
+        Firestore.
+        """
+        key = (collection, doc_id)
+        now = time.monotonic()
+        with self._lock:
+            last = self._fingerprints.get(key)
+            if (fingerprint is not None and last is not None and last[0] == fingerprint
+                    and now - last[1] < self.fingerprint_ttl):
+                self.skipped += 1
+                return False
+            if fingerprint is not None:
+                self._fingerprints[key] = (fingerprint, now)
+                self._fingerprints.move_to_end(key)
+                while len(self._fingerprints) > self.max_fingerprints:
+                    self._fingerprints.popitem(last=False)
+
+            if key in self._pending:
+                self._pending[key] = _coalesce(self._pending[key], fields)
+                self.coalesced += 1
+            else:
+                self._pending[key] = dict(fields)
+            self.queued += 1
+            pending = len(self._pending)
+
+        self._ensure_flusher()
+        if pending >= self.flush_size:
+            self._wake.set()
+        return True
+
+    def forget(self, collection, doc_id):
+        """Drop the fingerprint for a document changed outside the buffer.
+
+        The next write to it then goes out even if it repeats the last one.
+        """
+        with self._lock:
+            self._fingerprints.pop((collection, doc_id), None)
+
+    def flush(self):
+        """Write every pending document now (also run at exit)."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            items = list(pending.items())
+            for i in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+                chunk = items[i:i + FIRESTORE_BATCH_LIMIT]
+                try:
+                    db = self.get_db()
+                    batch = db.batch()
+                    for (collection, doc_id), fields in chunk:
+                        batch.set(db.collection(collection).document(doc_id), fields, merge=True)
+                    with metrics.upstream("firestore", "write_buffer_flush"):
+                        batch.commit()
+                    with self._lock:
+                        self.written += len(chunk)
+                        self.flushes += 1
+                except Exception as e:
+                    log.warning("Write buffer flush failed", docs=len(chunk), error=e)
+                    # Put them back underneath anything queued meanwhile
+                    with self._lock:
+                        self.flush_errors += 1
+                        for key, fields in chunk:
+                            newer = self._pending.get(key)
+                            self._pending[key] = _coalesce(fields, newer) if newer else fields
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "queued": self.queued,
+                "coalesced": self.coalesced,
+                "skipped": self.skipped,
+                "written": self.written,
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+            }
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="write-buffer", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()